@@ -0,0 +1,132 @@
+"""
+Archive-aware extraction: zip and tar members are streamed out of the
+container one at a time and sent to Tika concurrently, instead of handing the
+whole archive to Tika as a single document.
+"""
+
+import asyncio
+import logging
+import tarfile
+import traceback
+import zipfile
+from typing import Iterator, Tuple
+from app.tika_client import extract_metadata
+
+DEFAULT_MAX_MEMBERS = 1000
+DEFAULT_MAX_TOTAL_SIZE = 512 * 1024 * 1024
+DEFAULT_CONCURRENCY = 4
+
+class ArchiveLimitExceeded(Exception):
+    """Raised when an archive has more members or bytes than allowed."""
+
+def _read_limited(stream, name: str, remaining: int) -> bytes:
+    # Read one byte past the budget so that archives whose headers under-report
+    # the uncompressed size are still caught.
+    data = stream.read(remaining + 1)
+    if len(data) > remaining:
+        raise ArchiveLimitExceeded(f"Archive exceeds the uncompressed size limit at member {name}")
+    return data
+
+def iter_members(file_path: str, max_members: int = DEFAULT_MAX_MEMBERS,
+                 max_total_size: int = DEFAULT_MAX_TOTAL_SIZE) -> Iterator[Tuple[str, bytes]]:
+    """Yield (archive path, bytes) for each regular file in a zip or tar archive.
+
+    Members are read sequentially into memory; nothing is written to disk.
+    ArchiveLimitExceeded is raised once max_members or max_total_size would be
+    exceeded.
+    """
+    count = 0
+    total = 0
+
+    def check(name: str, size: int):
+        if count >= max_members:
+            raise ArchiveLimitExceeded(f"Archive has more than {max_members} members")
+        if total + size > max_total_size:
+            raise ArchiveLimitExceeded(f"Archive exceeds the uncompressed size limit at member {name}")
+
+    if zipfile.is_zipfile(file_path):
+        with zipfile.ZipFile(file_path) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                check(info.filename, info.file_size)
+                with archive.open(info) as stream:
+                    data = _read_limited(stream, info.filename, max_total_size - total)
+                count += 1
+                total += len(data)
+                yield info.filename, data
+    elif tarfile.is_tarfile(file_path):
+        # Stream mode reads the tar sequentially, which also works for
+        # compressed tars without seeking back and forth.
+        with tarfile.open(file_path, mode="r|*") as archive:
+            for info in archive:
+                if not info.isfile():
+                    continue
+                check(info.name, info.size)
+                stream = archive.extractfile(info)
+                data = _read_limited(stream, info.name, max_total_size - total)
+                count += 1
+                total += len(data)
+                yield info.name, data
+    else:
+        raise Exception(f"Not a zip or tar archive: {file_path}")
+
+async def extract_archive(file_path: str, tika_url: str, max_members: int = DEFAULT_MAX_MEMBERS,
+                          max_total_size: int = DEFAULT_MAX_TOTAL_SIZE,
+                          concurrency: int = DEFAULT_CONCURRENCY) -> dict:
+    """Extract every member of a zip or tar archive with Tika, concurrently.
+
+    At most `concurrency` members are held in memory or in flight at a time.
+    If a limit is hit, the members read so far are still returned and the
+    result is marked as truncated.
+    """
+    logging.info(f"extract_archive called with file_path: {file_path}, tika_url: {tika_url}")
+    semaphore = asyncio.Semaphore(concurrency)
+    members = iter_members(file_path, max_members, max_total_size)
+    tasks = []
+    truncated = None
+
+    async def extract_member(name: str, data: bytes) -> dict:
+        try:
+            metadata, content = await asyncio.to_thread(extract_metadata, data, tika_url)
+            return {"archive_path": name, "metadata": metadata, "content": content}
+        except Exception as e:
+            logging.error(f"Error extracting archive member {name}: {e}")
+            return {"archive_path": name, "error": str(e)}
+        finally:
+            semaphore.release()
+
+    try:
+        while True:
+            await semaphore.acquire()
+            try:
+                member = await asyncio.to_thread(next, members, None)
+            except BaseException:
+                semaphore.release()
+                raise
+            if member is None:
+                semaphore.release()
+                break
+            tasks.append(asyncio.create_task(extract_member(*member)))
+    except ArchiveLimitExceeded as e:
+        logging.warning(f"Stopped reading {file_path}: {e}")
+        truncated = str(e)
+    except Exception as e:
+        logging.error(f"Error reading archive {file_path}: {e}")
+        logging.error(traceback.format_exc())
+        for task in tasks:
+            task.cancel()
+        return {"error": str(e)}
+    finally:
+        # Close the archive file now rather than at garbage collection. A
+        # generator still running in its thread (on cancellation) cannot be
+        # closed and finishes on its own.
+        if not members.gi_running:
+            members.close()
+
+    results = await asyncio.gather(*tasks)
+    logging.info(f"Extracted {len(results)} members from {file_path}")
+    response = {"members": results}
+    if truncated:
+        response["truncated"] = truncated
+    return response
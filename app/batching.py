@@ -0,0 +1,123 @@
+"""
+Small-file batching: many small files are packed into one in-memory zip and
+sent to Tika in a single /rmeta call, and the per-member results are split
+back out. For folders of tiny files this removes most of the per-request
+HTTP and parser setup overhead.
+
+Members are named by position only, without their file names, because Tika
+sees no file name for a document extracted on its own either; that keeps
+type detection the same as per-file extraction. Metadata that Tika derives
+from the zip entry rather than from the document is removed from the
+results.
+"""
+
+import datetime
+import io
+import os
+import zipfile
+from typing import List, Optional, Tuple
+from app.tika_client import request_recursive_metadata
+
+# Files up to this size are candidates for batching.
+BATCH_MAX_FILE_SIZE = int(os.environ.get("TIKA_BATCH_MAX_FILE_SIZE", 64 * 1024))
+# Batching only kicks in for at least this many small files in one call.
+BATCH_MIN_FILES = int(os.environ.get("TIKA_BATCH_MIN_FILES", 8))
+# Upper bounds for a single batch request.
+BATCH_MAX_FILES = int(os.environ.get("TIKA_BATCH_MAX_FILES", 64))
+BATCH_MAX_BYTES = int(os.environ.get("TIKA_BATCH_MAX_BYTES", 4 * 1024 * 1024))
+# Batches extracted at the same time. Batch results reach callers through the
+# result cache, so this is kept well below its entry limit.
+BATCH_CONCURRENCY = 2
+
+# Keys /rmeta and Tika's zip parser add to describe a document's place in the
+# container; /meta does not return them for a document extracted on its own.
+RMETA_KEYS = {"X-TIKA:content", "X-TIKA:parse_time_millis", "resourceName", "embeddedRelationshipId",
+              "Content-Length", "X-TIKA:internalPath", "embeddedResourceType", "X-TIKA:Parsed-By-Full-Set"}
+RMETA_KEY_PREFIXES = ("X-TIKA:embedded_", "X-TIKA:final_embedded_")
+# Every member is stamped with the earliest date a zip entry can carry. Tika
+# reports the entry date as the member's modification date unless the
+# document has its own, so date keys holding this stamp are removed.
+ENTRY_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+ENTRY_DATE_KEYS = {"dcterms:modified", "Last-Modified", "modified", "meta:save-date"}
+# The JVM reads the entry date in its local time zone, up to 14 hours off UTC.
+ENTRY_DATE_TOLERANCE = datetime.timedelta(hours=14)
+
+def supports_batching(headers: dict) -> bool:
+    """Whether Tika will parse zip members at all with these request headers."""
+    return headers.get("X-Tika-Skip-Embedded", "false").lower() != "true"
+
+def plan_batches(sizes: List[Tuple[int, int]]) -> List[List[int]]:
+    """Group (index, size) pairs into batches within the file and byte limits."""
+    batches = []
+    current, current_bytes = [], 0
+    for index, size in sizes:
+        if current and (len(current) >= BATCH_MAX_FILES or current_bytes + size > BATCH_MAX_BYTES):
+            batches.append(current)
+            current, current_bytes = [], 0
+        current.append(index)
+        current_bytes += size
+    if current:
+        batches.append(current)
+    return batches
+
+def _member_name(position: int) -> str:
+    return f"{position:05d}"
+
+def pack(documents: List[bytes]) -> bytes:
+    """Pack documents into an uncompressed zip; small files rarely compress
+    enough to be worth Tika inflating them again."""
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_STORED) as archive:
+        for position, data in enumerate(documents):
+            archive.writestr(zipfile.ZipInfo(_member_name(position), ENTRY_DATE_TIME), data)
+    return output.getvalue()
+
+def _is_entry_date(value) -> bool:
+    values = value if isinstance(value, list) else [value]
+    stamp = datetime.datetime(*ENTRY_DATE_TIME, tzinfo=datetime.timezone.utc)
+    for item in values:
+        try:
+            parsed = datetime.datetime.fromisoformat(str(item).replace("Z", "+00:00"))
+        except ValueError:
+            return False
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+        if abs(parsed - stamp) > ENTRY_DATE_TOLERANCE:
+            return False
+    return bool(values)
+
+def _own_metadata(metadata: dict) -> dict:
+    """Member metadata without the keys that describe the container entry."""
+    return {key: value for key, value in metadata.items()
+            if key not in RMETA_KEYS and not key.startswith(RMETA_KEY_PREFIXES)
+            and not (key in ENTRY_DATE_KEYS and _is_entry_date(value))}
+
+def split_results(documents: list, count: int) -> List[Optional[Tuple[dict, str]]]:
+    """Map /rmeta output for a packed batch back to (metadata, text) per member.
+
+    A member is None when Tika reported an error for it or when it contains
+    embedded documents of its own: per-file extraction would flatten those
+    into its text, so such members are left for per-file extraction.
+    """
+    results: List[Optional[Tuple[dict, str]]] = [None] * count
+    nested = set()
+    for metadata in documents[1:]:
+        path = metadata.get("X-TIKA:embedded_resource_path", "")
+        parts = path.strip("/").split("/")
+        if not parts[0].isdigit() or int(parts[0]) >= count:
+            continue
+        position = int(parts[0])
+        if len(parts) > 1:
+            nested.add(position)
+            continue
+        if any(key.startswith("X-TIKA:EXCEPTION") for key in metadata):
+            continue
+        content = metadata.get("X-TIKA:content") or ""
+        results[position] = (_own_metadata(metadata), content)
+    for position in nested:
+        results[position] = None
+    return results
+
+def extract_batch(documents: List[bytes], tika_url: str, headers: dict) -> List[Optional[Tuple[dict, str]]]:
+    """Extract several small documents with one Tika request."""
+    return split_results(request_recursive_metadata(pack(documents), tika_url, headers), len(documents))
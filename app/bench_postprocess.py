@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the text post-processing pipeline.
+Reports throughput in MB/s and the size reduction, either on synthetic paged
+text or on plain-text files given on the command line (e.g. saved Tika output).
+"""
+
+import argparse
+import asyncio
+import pathlib
+import random
+import time
+from app.postprocess import postprocess_text, postprocess_text_async
+
+def synthetic_document(pages: int, seed: int = 0) -> str:
+    """Build text that looks like Tika output of a long paginated report."""
+    rng = random.Random(seed)
+    words = ["contract", "agreement", "party", "payment", "schedule", "clause",
+             "termination", "liability", "notice", "delivery", "invoice", "period"]
+    page_texts = []
+    for number in range(1, pages + 1):
+        lines = ["ACME Corp — Confidential", f"Annual Report 2024    Section {number // 10 + 1}", ""]
+        for _ in range(40):
+            line = " ".join(rng.choice(words) for _ in range(rng.randint(8, 14)))
+            if rng.random() < 0.2:
+                line += " " + rng.choice(words)[:4] + "-"
+                lines.append(line)
+                lines.append(rng.choice(words)[4:] + "  " + " ".join(rng.choice(words) for _ in range(6)))
+            else:
+                lines.append(line + ("   " if rng.random() < 0.3 else ""))
+        lines += ["", "", f"Page {number} of {pages}"]
+        page_texts.append("\n".join(lines))
+    return "\f".join(page_texts)
+
+def report(name: str, text: str, processed: str, elapsed: float):
+    size_mb = len(text.encode("utf-8")) / (1024 * 1024)
+    reduction = 100.0 * (1 - len(processed) / len(text)) if text else 0.0
+    print(f"{name}: {size_mb:.2f} MB in {elapsed:.3f}s -> {size_mb / elapsed:.1f} MB/s, "
+          f"{len(text)} -> {len(processed)} chars ({reduction:.1f}% smaller)")
+
+async def bench_pool(texts, label: str):
+    start = time.perf_counter()
+    results = await asyncio.gather(*(postprocess_text_async(text) for text in texts))
+    elapsed = time.perf_counter() - start
+    combined = "".join(texts)
+    report(label, combined, "".join(processed for processed, _ in results), elapsed)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark text post-processing")
+    parser.add_argument("files", nargs="*", help="Plain-text files to process (default: synthetic text)")
+    parser.add_argument("--pages", type=int, default=2000, help="Pages per synthetic document")
+    parser.add_argument("--documents", type=int, default=4, help="Synthetic documents for the concurrent run")
+    args = parser.parse_args()
+
+    if args.files:
+        texts = [pathlib.Path(path).read_text(encoding="utf-8", errors="replace") for path in args.files]
+        names = args.files
+    else:
+        texts = [synthetic_document(args.pages, seed) for seed in range(args.documents)]
+        names = [f"synthetic-{seed}" for seed in range(args.documents)]
+
+    print("Single document, in process:")
+    for name, text in zip(names, texts):
+        start = time.perf_counter()
+        processed = postprocess_text(text)
+        report(name, text, processed, time.perf_counter() - start)
+
+    print("All documents concurrently (process pool above the size threshold):")
+    asyncio.run(bench_pool(texts, "combined"))
+
+if __name__ == "__main__":
+    main()
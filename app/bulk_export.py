@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Offline bulk extraction of a directory tree or manifest into compressed JSONL
+or Parquet shards of {path, hash, metadata, text}, without going through MCP.
+
+Inputs are streamed in a deterministic order and extracted concurrently with
+a bounded number of files in flight. Shards are written to a temporary name
+and renamed when complete, and a checkpoint is saved after every shard, so an
+interrupted run of the same source picks up where the last complete shard
+left off. Files that fail after retries are appended to failed.jsonl instead
+of aborting the run; that file can be passed back in as a manifest, and the
+files that fail again then go to failed.1.jsonl.
+
+Example:
+    python -m app.bulk_export /data/corpus out/ --concurrency 8 --format jsonl
+"""
+
+import argparse
+import gzip
+import itertools
+import json
+import logging
+import os
+import pathlib
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Iterator, Optional, Tuple
+from app.cache import content_hash
+from app.model import read_file_bytes
+from app.profiles import DEFAULT_PROFILE, profile_headers
+from app.tika_client import extract_metadata
+
+CHECKPOINT_FILE = "checkpoint.json"
+FAILED_FILE = "failed.jsonl"
+
+def iter_directory(root: str) -> Iterator[str]:
+    """Walk a directory tree in sorted order, so runs can be resumed by position."""
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories.sort()
+        for name in sorted(files):
+            yield os.path.join(directory, name)
+
+def iter_manifest(manifest: str) -> Iterator[str]:
+    """Read paths from a manifest: one path per line, or JSON lines with a "path" key."""
+    with open(manifest, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                yield json.loads(line)["path"]
+            else:
+                yield line
+
+def iter_inputs(source: str) -> Iterator[str]:
+    return iter_directory(source) if os.path.isdir(source) else iter_manifest(source)
+
+class ShardWriter:
+    """Writes records to numbered shards, each renamed into place when complete."""
+
+    def __init__(self, output_dir: pathlib.Path, output_format: str, shard_size: int, first_shard: int):
+        self.output_dir = output_dir
+        self.output_format = output_format
+        self.shard_size = shard_size
+        self.shard = first_shard
+        self.count = 0
+        self.handle = None
+        self.rows = []
+        if output_format == "parquet":
+            # Imported lazily so JSONL exports do not need pyarrow installed.
+            import pyarrow
+            import pyarrow.parquet
+            self.pyarrow = pyarrow
+            self.parquet = pyarrow.parquet
+
+    def _path(self) -> pathlib.Path:
+        suffix = "parquet" if self.output_format == "parquet" else "jsonl.gz"
+        return self.output_dir / f"part-{self.shard:05d}.{suffix}"
+
+    def _temporary_path(self) -> pathlib.Path:
+        return self._path().with_name(self._path().name + ".tmp")
+
+    def write(self, record: dict) -> bool:
+        """Add a record; returns True when this completed (and closed) a shard."""
+        if self.output_format == "parquet":
+            self.rows.append(dict(record, metadata=json.dumps(record["metadata"])))
+        else:
+            if self.handle is None:
+                self.handle = gzip.open(self._temporary_path(), "wt", encoding="utf-8")
+            self.handle.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.count += 1
+        if self.count >= self.shard_size:
+            self.close()
+            return True
+        return False
+
+    def close(self):
+        if not self.count:
+            return
+        if self.output_format == "parquet":
+            table = self.pyarrow.Table.from_pylist(self.rows)
+            self.parquet.write_table(table, self._temporary_path(), compression="zstd")
+            self.rows = []
+        else:
+            self.handle.close()
+            self.handle = None
+        os.replace(self._temporary_path(), self._path())
+        self.shard += 1
+        self.count = 0
+
+def source_identity(source: str) -> dict:
+    """Identify an input source, so positions are never applied to another one.
+
+    Directories are identified by path; manifests also by a hash of their
+    contents, since a regenerated manifest lists different files.
+    """
+    identity = {"path": os.path.abspath(source)}
+    if not os.path.isdir(source):
+        identity["sha256"] = content_hash(pathlib.Path(source).read_bytes())
+    return identity
+
+class Checkpoint:
+    """Tracks which inputs are safely written, by position in the input order.
+
+    Everything before next_index is done; done_beyond holds positions past it
+    that finished early and were already written to a complete shard.
+    Positions belong to the source recorded with them. A finished run can be
+    followed by one over another source, such as its failed.jsonl, which
+    starts from position 0 and appends its own shards; an unfinished run must
+    be resumed with its own source first.
+    """
+
+    def __init__(self, path: pathlib.Path, source: dict):
+        self.path = path
+        self.source = source
+        self.next_index = 0
+        self.done_beyond = set()
+        self.shards = 0
+        self.totals = {"files": 0, "bytes": 0, "failed": 0}
+        state = json.loads(path.read_text()) if path.exists() else None
+        if state is not None and state["source"] != source:
+            if not state["complete"]:
+                raise ValueError(f"{path} belongs to an unfinished run over {state['source']['path']}; "
+                                 f"resume that run or use another output directory")
+            logging.info(f"Previous run over {state['source']['path']} is complete; starting a new one")
+            self.shards = state["shards"]
+            state = None
+        if state is not None:
+            self.next_index = state["next_index"]
+            self.done_beyond = set(state["done_beyond"])
+            self.shards = state["shards"]
+            self.totals = state["totals"]
+            self.failed_file = state["failed_file"]
+        else:
+            # Each source gets a failure file of its own, so a retry run never
+            # appends to the failed.jsonl it is reading.
+            self.failed_file = next(name for name in (FAILED_FILE if n == 0 else f"failed.{n}.jsonl"
+                                                      for n in itertools.count())
+                                    if not (path.parent / name).exists())
+
+    def is_done(self, index: int) -> bool:
+        return index < self.next_index or index in self.done_beyond
+
+    def save(self, written: set, shards: int, totals: dict, complete: bool = False):
+        self.done_beyond |= written
+        while self.next_index in self.done_beyond:
+            self.done_beyond.discard(self.next_index)
+            self.next_index += 1
+        self.shards = shards
+        self.totals = dict(totals)
+        state = {"source": self.source, "failed_file": self.failed_file, "complete": complete,
+                 "next_index": self.next_index, "done_beyond": sorted(self.done_beyond),
+                 "shards": shards, "totals": self.totals}
+        temporary = self.path.with_name(self.path.name + ".tmp")
+        temporary.write_text(json.dumps(state))
+        os.replace(temporary, self.path)
+
+def extract_one(path: str, tika_url: str, headers: dict, retries: int) -> Tuple[Optional[dict], Optional[str], int]:
+    """Extract one file, retrying transient failures. Returns (record, error, size)."""
+    error = None
+    size = 0
+    for attempt in range(retries + 1):
+        try:
+            file_bytes = read_file_bytes(path)
+            size = len(file_bytes)
+            metadata, text = extract_metadata(file_bytes, tika_url, headers)
+            return {"path": path, "hash": content_hash(file_bytes), "metadata": metadata, "text": text}, None, size
+        except Exception as e:
+            error = str(e)
+            if attempt < retries:
+                time.sleep(min(30, 2 ** attempt))
+    return None, error, size
+
+def run(source: str, output_dir: str, tika_url: str, output_format: str = "jsonl", concurrency: int = 4,
+        shard_size: int = 1000, retries: int = 2, profile: str = DEFAULT_PROFILE,
+        report_interval: float = 10.0) -> dict:
+    output = pathlib.Path(output_dir)
+    output.mkdir(parents=True, exist_ok=True)
+    checkpoint = Checkpoint(output / CHECKPOINT_FILE, source_identity(source))
+    writer = ShardWriter(output, output_format, shard_size, checkpoint.shards)
+    headers = profile_headers(profile)
+    totals = dict(checkpoint.totals)
+    # Positions and bytes written to the shard that is still open.
+    pending_positions = set()
+    pending_bytes = 0
+    started = time.monotonic()
+    last_report = started
+    run_files = run_bytes = 0
+
+    def durable_totals() -> dict:
+        # Records in the open shard are redone after a restart, so they are
+        # not part of the checkpointed totals yet.
+        return dict(totals, files=totals["files"] - len(pending_positions), bytes=totals["bytes"] - pending_bytes)
+
+    def record_done(index: int, path: str, record: Optional[dict], error: Optional[str], size: int):
+        nonlocal run_files, run_bytes, pending_bytes
+        if record is None:
+            logging.warning(f"Giving up on {path}: {error}")
+            with open(output / checkpoint.failed_file, "a", encoding="utf-8") as failed:
+                failed.write(json.dumps({"path": path, "error": error}) + "\n")
+            totals["failed"] += 1
+            # Failures are recorded durably right away, so they count as done.
+            checkpoint.save({index}, writer.shard, durable_totals())
+            return
+        totals["files"] += 1
+        totals["bytes"] += size
+        run_files += 1
+        run_bytes += size
+        pending_positions.add(index)
+        pending_bytes += size
+        if writer.write(record):
+            checkpoint.save(pending_positions, writer.shard, totals)
+            pending_positions.clear()
+            pending_bytes = 0
+
+    def collect(futures):
+        for future in futures:
+            index, path = in_flight.pop(future)
+            record_done(index, path, *future.result())
+
+    def report(final: bool = False):
+        elapsed = max(time.monotonic() - started, 1e-9)
+        print(f"{'✅ Done' if final else '⏱️'} {run_files} files, {run_bytes / 1048576:.1f} MB in {elapsed:.0f}s "
+              f"({run_files / elapsed:.1f} files/s, {run_bytes / 1048576 / elapsed:.2f} MB/s), "
+              f"{totals['failed']} failed in total", file=sys.stderr)
+
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for index, path in enumerate(iter_inputs(source)):
+            if checkpoint.is_done(index):
+                continue
+            # Keep a small backlog beyond the worker count, so memory stays
+            # bounded however many inputs there are.
+            while len(in_flight) >= concurrency * 2:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(finished)
+            in_flight[executor.submit(extract_one, path, tika_url, headers, retries)] = (index, path)
+            if time.monotonic() - last_report >= report_interval:
+                report()
+                last_report = time.monotonic()
+        collect(list(in_flight))
+
+    writer.close()
+    checkpoint.save(pending_positions, writer.shard, totals, complete=True)
+    report(final=True)
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-extract files with Tika into JSONL or Parquet shards")
+    parser.add_argument("source", help="Directory to walk, or a manifest of paths (one per line or JSON lines with \"path\")")
+    parser.add_argument("output_dir", help="Directory for shards, the checkpoint and failed.jsonl (failed.1.jsonl, ... for later sources)")
+    parser.add_argument("--tika-url", default="http://localhost:9998", help="URL of the Tika server (default: http://localhost:9998)")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl", help="Shard format (parquet needs pyarrow)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Files extracted in parallel")
+    parser.add_argument("--shard-size", type=int, default=1000, help="Records per shard")
+    parser.add_argument("--retries", type=int, default=2, help="Retries per file before it goes to failed.jsonl")
+    parser.add_argument("--profile", default=DEFAULT_PROFILE, help="Extraction profile (default, fast, balanced, thorough)")
+    parser.add_argument("--report-interval", type=float, default=10.0, help="Seconds between throughput reports")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    try:
+        run(args.source, args.output_dir, args.tika_url, args.format, args.concurrency,
+            args.shard_size, args.retries, args.profile, args.report_interval)
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+In-memory LRU cache of extraction results, keyed by the SHA-256 of the file
+contents together with the extraction options.
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+DEFAULT_MAX_ENTRIES = int(os.environ.get("TIKA_CACHE_MAX_ENTRIES", 256))
+DEFAULT_MAX_BYTES = int(os.environ.get("TIKA_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+def content_hash(file_bytes: bytes) -> str:
+    return hashlib.sha256(file_bytes).hexdigest()
+
+def make_key(digest: str, **options) -> str:
+    """Build a cache key from a content hash and the options that shape the result."""
+    return digest + ":" + json.dumps(options, sort_keys=True, default=str)
+
+def _result_size(result: dict) -> int:
+    # Content dominates the size of a result; metadata is small in comparison.
+    content = result.get("content")
+    if isinstance(content, str):
+        return len(content) + 1024
+    return len(json.dumps(content, default=str)) + 1024
+
+class ResultCache:
+    """Thread-safe LRU cache bounded by entry count and approximate size.
+
+    Each entry remembers where it came from ("request" or "prefetch"), so the
+    prefetcher can tell whether its work was ever used.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[str, dict]" = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.prefetch_hits = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: str, background: bool = False) -> Optional[dict]:
+        """Return a copy of the cached result, or None.
+
+        Background lookups (prefetching) do not count towards the hit rate or
+        mark prefetched entries as used.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if background:
+                return copy.deepcopy(entry["result"]) if entry is not None else None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            if entry["source"] == "prefetch" and not entry["used"]:
+                self.prefetch_hits += 1
+            entry["used"] = True
+            return copy.deepcopy(entry["result"])
+
+    def __contains__(self, key: str) -> bool:
+        with self.lock:
+            return key in self.entries
+
+    def put(self, key: str, result: dict, source: str = "request"):
+        size = _result_size(result)
+        if size > self.max_bytes:
+            logging.info(f"Not caching result of {size} bytes (limit {self.max_bytes})")
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old["size"]
+            self.entries[key] = {
+                "result": copy.deepcopy(result),
+                "size": size,
+                "source": source,
+                "used": source != "prefetch",
+            }
+            self.size += size
+            while self.entries and (len(self.entries) > self.max_entries or self.size > self.max_bytes):
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= evicted["size"]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+result_cache = ResultCache()
@@ -0,0 +1,265 @@
+"""
+Cluster mode: several server instances share one membership list and route
+each extraction, by the content hash of the document, to the node that owns
+it on a consistent-hash ring. Every document is then cached on a single
+node, so adding nodes grows the cache instead of splitting its hits.
+
+Each node in the ring is placed at many virtual points, so ownership is
+spread evenly and a node joining or leaving only moves about 1/N of the
+documents. Nodes talk to each other over a small internal HTTP endpoint;
+a node that cannot be reached is skipped for a while, its documents go to
+the next node on the ring, and the caller falls back to extracting locally.
+"""
+
+import asyncio
+import bisect
+import hashlib
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+from app.tika_client import get_session
+
+# This node's own URL as it appears in the membership list; cluster mode is
+# off unless it is set.
+CLUSTER_SELF = os.environ.get("TIKA_CLUSTER_SELF", "")
+# Comma-separated node URLs, or the path of a file with one URL per line.
+# A file is re-read when it changes, so nodes can join and leave at runtime.
+CLUSTER_NODES = os.environ.get("TIKA_CLUSTER_NODES", "")
+# Required whenever the peer endpoint listens on anything but loopback: it
+# sends uploads to the Tika URL the caller names.
+CLUSTER_SECRET = os.environ.get("TIKA_CLUSTER_SECRET", "")
+# Address the peer endpoint listens on; defaults to the host of TIKA_CLUSTER_SELF.
+CLUSTER_BIND = os.environ.get("TIKA_CLUSTER_BIND", "")
+VIRTUAL_NODES = int(os.environ.get("TIKA_CLUSTER_VNODES", 256))
+# Seconds an unreachable node is left out of the ring.
+RETRY_AFTER = float(os.environ.get("TIKA_CLUSTER_RETRY_AFTER", 10))
+FORWARD_TIMEOUT = float(os.environ.get("TIKA_CLUSTER_TIMEOUT", 600))
+MEMBERSHIP_CHECK_INTERVAL = 1.0
+
+def _point(value: str) -> int:
+    return int.from_bytes(hashlib.sha256(value.encode("utf-8")).digest()[:8], "big")
+
+class HashRing:
+    """Consistent-hash ring with virtual nodes."""
+
+    def __init__(self, nodes: Iterable[str] = (), virtual_nodes: int = VIRTUAL_NODES):
+        self.virtual_nodes = virtual_nodes
+        self.nodes = sorted(set(nodes))
+        self.points: List[int] = []
+        self.owners: List[str] = []
+        for point, node in sorted((_point(f"{node}#{i}"), node) for node in self.nodes for i in range(virtual_nodes)):
+            self.points.append(point)
+            self.owners.append(node)
+
+    def owner(self, key: str, exclude: Iterable[str] = ()) -> Optional[str]:
+        """The first node clockwise from key's point that is not excluded."""
+        excluded = set(exclude)
+        if not self.points or excluded.issuperset(self.nodes):
+            return None
+        start = bisect.bisect(self.points, _point(key))
+        for offset in range(len(self.points)):
+            node = self.owners[(start + offset) % len(self.points)]
+            if node not in excluded:
+                return node
+        return None
+
+    def shares(self) -> Dict[str, float]:
+        """Fraction of the hash space owned by each node."""
+        shares = dict.fromkeys(self.nodes, 0.0)
+        space = 2 ** 64
+        for index, point in enumerate(self.points):
+            previous = self.points[index - 1] if index else self.points[-1] - space
+            shares[self.owners[index]] += (point - previous) / space
+        return shares
+
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+def _parse_nodes(spec: str) -> List[str]:
+    if spec and os.path.isfile(spec):
+        with open(spec, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    else:
+        lines = spec.split(",")
+    return [line.strip().rstrip("/") for line in lines if line.strip() and not line.strip().startswith("#")]
+
+class Cluster:
+    """Membership, routing and forwarding for one node."""
+
+    def __init__(self, self_url: str = CLUSTER_SELF, nodes: str = CLUSTER_NODES,
+                 virtual_nodes: int = VIRTUAL_NODES, secret: str = CLUSTER_SECRET):
+        self.self_url = self_url.rstrip("/")
+        self.nodes_spec = nodes
+        self.virtual_nodes = virtual_nodes
+        self.secret = secret
+        self.enabled = bool(self.self_url)
+        self.ring = HashRing([], virtual_nodes)
+        self.membership_mtime = None
+        self.last_membership_check = 0.0
+        self.down_until: Dict[str, float] = {}
+        self.server: Optional[ThreadingHTTPServer] = None
+        self.lock = threading.Lock()
+        self.forwarded = 0
+        self.served_for_peers = 0
+        self.fallbacks = 0
+        if self.enabled:
+            self._load_membership()
+
+    def _load_membership(self):
+        nodes = _parse_nodes(self.nodes_spec)
+        if self.self_url not in nodes:
+            nodes.append(self.self_url)
+        if nodes != self.ring.nodes:
+            logging.info(f"Cluster membership: {sorted(nodes)}")
+            self.ring = HashRing(nodes, self.virtual_nodes)
+
+    def _refresh_membership(self):
+        now = time.monotonic()
+        if now - self.last_membership_check < MEMBERSHIP_CHECK_INTERVAL or not os.path.isfile(self.nodes_spec):
+            return
+        self.last_membership_check = now
+        mtime = os.path.getmtime(self.nodes_spec)
+        if mtime != self.membership_mtime:
+            self.membership_mtime = mtime
+            self._load_membership()
+
+    def owner_for(self, digest: str) -> Optional[str]:
+        """The peer that owns a document, or None if this node owns it."""
+        if not self.enabled:
+            return None
+        with self.lock:
+            self._refresh_membership()
+            now = time.monotonic()
+            down = {node for node, until in self.down_until.items() if until > now}
+            owner = self.ring.owner(digest, exclude=down - {self.self_url})
+        return None if owner in (None, self.self_url) else owner
+
+    def _mark_down(self, node: str):
+        with self.lock:
+            self.down_until[node] = time.monotonic() + RETRY_AFTER
+
+    def _forward(self, node: str, file_bytes: bytes, tika_url: str, options: dict) -> Optional[dict]:
+        headers = {"X-Tika-MCP-Request": json.dumps({"tika_url": tika_url, "options": options}),
+                   "Content-Type": "application/octet-stream"}
+        if self.secret:
+            headers["X-Tika-MCP-Secret"] = self.secret
+        try:
+            response = get_session().post(f"{node}/extract", data=file_bytes, headers=headers,
+                                          timeout=FORWARD_TIMEOUT)
+            response.raise_for_status()
+            reply = response.json()
+        except Exception as e:
+            logging.warning(f"Cluster node {node} unavailable, extracting locally: {e}")
+            self._mark_down(node)
+            self.fallbacks += 1
+            return None
+        self.forwarded += 1
+        if "error" in reply:
+            # The owner reached Tika and the extraction itself failed.
+            raise Exception(reply["error"])
+        return reply["result"]
+
+    async def forward(self, node: str, file_bytes: bytes, tika_url: str, options: dict) -> Optional[dict]:
+        """Have the owning node extract a document, through its cache.
+
+        Returns None if the node could not be reached, so the caller can
+        extract locally instead. Extraction errors on the owner are raised.
+        """
+        return await asyncio.to_thread(self._forward, node, file_bytes, tika_url, options)
+
+    def start(self, loop: asyncio.AbstractEventLoop, extract):
+        """Serve extraction requests from peers on this node's own URL.
+
+        extract(file_bytes, tika_url, options) is a coroutine function run on
+        loop, which must extract locally without routing again.
+        """
+        if not self.enabled:
+            return
+        cluster = self
+
+        class PeerHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status: int, payload: dict):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                if self.path != "/extract":
+                    self._reply(404, {"error": "Not found"})
+                    return
+                if cluster.secret and not hmac.compare_digest(
+                        self.headers.get("X-Tika-MCP-Secret", "").encode("utf-8"), cluster.secret.encode("utf-8")):
+                    self._reply(403, {"error": "Forbidden"})
+                    return
+                file_bytes = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                try:
+                    request = json.loads(self.headers["X-Tika-MCP-Request"])
+                    tika_url, options = request["tika_url"], request["options"]
+                    if not isinstance(tika_url, str) or not isinstance(options, dict):
+                        raise ValueError("tika_url must be a string and options an object")
+                except (KeyError, TypeError, ValueError) as e:
+                    self._reply(400, {"error": f"Bad request: {e}"})
+                    return
+                future = asyncio.run_coroutine_threadsafe(extract(file_bytes, tika_url, options), loop)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    self._reply(200, {"error": str(e)})
+                    return
+                cluster.served_for_peers += 1
+                self._reply(200, {"result": result})
+
+        address = urlparse(self.self_url)
+        host = CLUSTER_BIND or address.hostname or ""
+        if not self.secret and not _is_loopback(host):
+            raise Exception(f"TIKA_CLUSTER_SECRET must be set for a peer endpoint listening on {host or 'all interfaces'}")
+        self.server = ThreadingHTTPServer((host, address.port or 80), PeerHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        logging.info(f"Cluster node {self.self_url} serving peers on port {self.server.server_port}")
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def stats(self) -> dict:
+        if not self.enabled:
+            return {"enabled": False}
+        with self.lock:
+            now = time.monotonic()
+            down = sorted(node for node, until in self.down_until.items() if until > now)
+            shares = self.ring.shares()
+        return {
+            "enabled": True,
+            "self": self.self_url,
+            "nodes": sorted(shares),
+            "down": down,
+            "share": shares,
+            "forwarded": self.forwarded,
+            "served_for_peers": self.served_for_peers,
+            "fallbacks": self.fallbacks,
+        }
+
+cluster = Cluster()
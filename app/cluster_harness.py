@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Local test of cluster mode with several server processes.
+
+Starts a stand-in Tika and N FastMCP server processes that share a
+membership file, then extracts a set of distinct documents through random
+nodes, twice, counting the extractions that reach Tika. With cluster mode
+each document is extracted once, on its owner, however many nodes it is
+requested through. Finally one node is removed from the membership file,
+and the harness measures how many documents changed owner and how many had
+to be extracted again.
+
+Example:
+    python -m app.cluster_harness --nodes 3 --documents 60
+    python -m app.cluster_harness --nodes 3 --documents 60 --no-cluster
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+from app.cluster import HashRing
+from app.cache import content_hash
+from app.soak_harness import Session
+from app.stub_tika import start_stub
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _tika_extractions(stub) -> int:
+    # Every text extraction makes exactly one request to /tika.
+    with stub.counter_lock:
+        return stub.put_requests["/tika"]
+
+def _write_membership(path: str, nodes: list):
+    temporary = path + ".tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        f.write("\n".join(nodes) + "\n")
+    os.replace(temporary, path)
+
+def _extract_through(sessions: list, files: list, tika_url: str, avoid: dict, rng: random.Random) -> int:
+    """Extract every file through a random node, other than avoid[file] when possible."""
+    errors = 0
+    for file_path in files:
+        choices = [index for index in range(len(sessions)) if index != avoid.get(file_path)] or list(range(len(sessions)))
+        index = rng.choice(choices)
+        avoid[file_path] = index
+        response = sessions[index].request("tools/call", {
+            "name": "extract_file",
+            "arguments": {"file_path": file_path, "tika_url": tika_url, "preprocess_images": False},
+        })
+        if "error" in response or response.get("result", {}).get("isError"):
+            errors += 1
+    return errors
+
+def main():
+    parser = argparse.ArgumentParser(description="Exercise cluster mode with several local server processes")
+    parser.add_argument("--nodes", type=int, default=3, help="Server processes to start")
+    parser.add_argument("--documents", type=int, default=60, help="Distinct documents to extract")
+    parser.add_argument("--no-cluster", action="store_true", help="Run the servers without cluster mode, for comparison")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the choice of node per request")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    stub = start_stub(0)
+    tika_url = f"http://127.0.0.1:{stub.server_port}"
+    workdir = tempfile.mkdtemp(prefix="tika-mcp-cluster-")
+    files = []
+    for number in range(args.documents):
+        path = os.path.join(workdir, f"doc-{number:04d}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"Document {number}\n" * 20)
+        files.append(path)
+
+    nodes = [f"http://127.0.0.1:{_free_port()}" for _ in range(args.nodes)]
+    membership = os.path.join(workdir, "members.txt")
+    _write_membership(membership, nodes)
+    sessions = []
+    for index, node in enumerate(nodes):
+        env = {"TIKA_JOB_DB": os.path.join(workdir, f"jobs-{index}.db")}
+        if not args.no_cluster:
+            env.update(TIKA_CLUSTER_SELF=node, TIKA_CLUSTER_NODES=membership)
+        sessions.append(Session(index, "fastmcp", tika_url, files, workdir, env))
+
+    report = {"nodes": args.nodes, "documents": args.documents, "cluster": not args.no_cluster}
+    try:
+        for session in sessions:
+            session.initialize()
+        # Give the peer endpoints a moment to start listening.
+        time.sleep(0.5)
+        last_node = {}
+        errors = _extract_through(sessions, files, tika_url, last_node, rng)
+        report["first_pass_extractions"] = _tika_extractions(stub)
+        errors += _extract_through(sessions, files, tika_url, last_node, rng)
+        report["second_pass_extractions"] = _tika_extractions(stub) - report["first_pass_extractions"]
+
+        # One node leaves: only the documents it owned should move.
+        before = HashRing(nodes)
+        after = HashRing(nodes[:-1])
+        digests = []
+        for path in files:
+            with open(path, "rb") as f:
+                digests.append(content_hash(f.read()))
+        moved = sum(before.owner(digest) != after.owner(digest) for digest in digests)
+        report["owners_moved_on_leave"] = moved / len(files)
+        _write_membership(membership, nodes[:-1])
+        sessions[-1].close()
+        # Let the remaining nodes notice the new membership file.
+        time.sleep(1.5)
+        extracted = _tika_extractions(stub)
+        errors += _extract_through(sessions[:-1], files, tika_url, last_node, rng)
+        report["extractions_after_leave"] = _tika_extractions(stub) - extracted
+        report["errors"] = errors
+    finally:
+        for session in sessions:
+            session.close()
+        stub.shutdown()
+
+    print(json.dumps(report, indent=2))
+    return 1 if report.get("errors") else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""
+Adaptive concurrency limits for requests to Tika.
+
+Each Tika backend gets an AIMD limiter: the limit grows by one per window of
+successful requests while latency stays near its baseline, and is cut
+multiplicatively when Tika reports overload, connections fail, or latency
+rises well above the baseline. Latency is tracked per endpoint, since a
+/detect call and an OCR /tika call differ in cost by orders of magnitude and
+a mix of them says nothing about load. Callers block while the limit is
+reached.
+"""
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+ADAPTIVE_CONCURRENCY = os.environ.get("TIKA_ADAPTIVE_CONCURRENCY", "1").lower() in ("1", "true", "yes")
+INITIAL_LIMIT = int(os.environ.get("TIKA_CONCURRENCY_INITIAL", 8))
+MIN_LIMIT = int(os.environ.get("TIKA_CONCURRENCY_MIN", 1))
+MAX_LIMIT = int(os.environ.get("TIKA_CONCURRENCY_MAX", 64))
+
+# Multiplier applied to the limit on an overload signal.
+BACKOFF_RATIO = 0.7
+# A request slower than this multiple of the baseline counts as overload.
+LATENCY_TOLERANCE = 2.5
+# Smoothing factors for the short-term latency and the slower baseline.
+SHORT_ALPHA = 0.3
+BASELINE_ALPHA = 0.02
+# Minimum time between two decreases, so one burst of failures does not
+# collapse the limit.
+DECREASE_COOLDOWN = 1.0
+
+class AdaptiveLimiter:
+    """Thread-safe AIMD concurrency limiter for one backend."""
+
+    def __init__(self, initial: int = INITIAL_LIMIT, minimum: int = MIN_LIMIT, maximum: int = MAX_LIMIT):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        # Short-term latency and baseline of each endpoint.
+        self.latencies: Dict[str, List[float]] = {}
+        self.successes = 0
+        self.overloads = 0
+        self.decreases = 0
+        self.last_decrease = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, latency: float, outcome: str = "success", endpoint: str = "tika"):
+        """Free a slot; outcome is "success", "overload" or "ignored"."""
+        with self.condition:
+            saturated = self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            if outcome == "overload":
+                self.overloads += 1
+                self._decrease()
+            elif outcome == "success":
+                self.successes += 1
+                self._observe(endpoint, latency, saturated)
+            self.condition.notify_all()
+
+    def _observe(self, endpoint: str, latency: float, saturated: bool):
+        latencies = self.latencies.get(endpoint)
+        if latencies is None:
+            self.latencies[endpoint] = [latency, latency]
+            return
+        latencies[0] += SHORT_ALPHA * (latency - latencies[0])
+        # The baseline follows latency slowly, so it absorbs lasting changes in
+        # document cost while short spikes from queueing stand out against it.
+        latencies[1] += BASELINE_ALPHA * (latency - latencies[1])
+        if latencies[0] > latencies[1] * LATENCY_TOLERANCE:
+            self._decrease()
+        elif saturated:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self.last_decrease < DECREASE_COOLDOWN:
+            return
+        self.last_decrease = now
+        self.limit = max(self.minimum, self.limit * BACKOFF_RATIO)
+        self.decreases += 1
+        logging.info(f"Reducing Tika concurrency limit to {int(self.limit)}")
+
+    def stats(self) -> dict:
+        with self.condition:
+            return {
+                "limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "latency": {endpoint: latencies[0] for endpoint, latencies in self.latencies.items()},
+                "baseline_latency": {endpoint: latencies[1] for endpoint, latencies in self.latencies.items()},
+                "successes": self.successes,
+                "overloads": self.overloads,
+                "decreases": self.decreases,
+            }
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def limiter_for(tika_url: str) -> AdaptiveLimiter:
+    with _limiters_lock:
+        limiter = _limiters.get(tika_url)
+        if limiter is None:
+            limiter = _limiters[tika_url] = AdaptiveLimiter()
+        return limiter
+
+@contextmanager
+def limited(tika_url: str, is_overload, endpoint: str = "tika") -> Iterator[None]:
+    """Hold a concurrency slot for tika_url around a request to endpoint.
+
+    is_overload(exception) decides whether a failure should shrink the limit;
+    other failures release the slot without adjusting it.
+    """
+    if not ADAPTIVE_CONCURRENCY:
+        yield
+        return
+    limiter = limiter_for(tika_url)
+    limiter.acquire()
+    started = time.monotonic()
+    try:
+        yield
+    except Exception as e:
+        limiter.release(time.monotonic() - started, "overload" if is_overload(e) else "ignored", endpoint)
+        raise
+    else:
+        limiter.release(time.monotonic() - started, endpoint=endpoint)
+
+def stats() -> dict:
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {"enabled": ADAPTIVE_CONCURRENCY, "backends": {url: limiter.stats() for url, limiter in limiters.items()}}
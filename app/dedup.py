@@ -0,0 +1,170 @@
+"""
+Near-duplicate detection over extracted text with MinHash signatures and LSH.
+
+Documents are reduced to word shingles, each shingle is hashed to 32 bits and
+a MinHash signature is computed for all permutations at once with numpy. The
+LSH index splits signatures into bands so that candidate pairs are found in
+roughly constant time per query.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+DEFAULT_NUM_PERM = 128
+DEFAULT_BANDS = 16
+DEFAULT_SHINGLE_SIZE = 5
+DEFAULT_THRESHOLD = 0.8
+# Documents kept in an index; the least recently indexed are evicted first.
+DEFAULT_MAX_DOCUMENTS = int(os.environ.get("TIKA_DEDUP_MAX_DOCUMENTS", 50000))
+
+# Number of shingles hashed against every permutation in one numpy step;
+# bounds the temporary (num_perm x block) matrix on very large documents.
+SHINGLE_BLOCK = 8192
+
+_WORD_RE = re.compile(r"\w+")
+
+def shingle_hashes(text: str, shingle_size: int = DEFAULT_SHINGLE_SIZE) -> np.ndarray:
+    """Return the distinct 32-bit hashes of the word shingles in text."""
+    words = _WORD_RE.findall(text.lower())
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    word_hashes = np.fromiter((zlib.crc32(w.encode("utf-8")) for w in words), dtype=np.uint64, count=len(words))
+    if len(words) < shingle_size:
+        shingle_size = len(words)
+    # Polynomial combination of the word hashes in each window, computed with
+    # wrapping uint64 arithmetic and folded back to 32 bits.
+    count = len(words) - shingle_size + 1
+    combined = np.zeros(count, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for offset in range(shingle_size):
+            combined = combined * np.uint64(1000003) + word_hashes[offset:offset + count]
+    return np.unique((combined ^ (combined >> np.uint64(32))) & MAX_HASH)
+
+class MinHasher:
+    """Computes MinHash signatures with a fixed family of permutations."""
+
+    def __init__(self, num_perm: int = DEFAULT_NUM_PERM, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.a = rng.randint(1, (1 << 61) - 1, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, (1 << 61) - 1, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str, shingle_size: int = DEFAULT_SHINGLE_SIZE) -> np.ndarray:
+        hashes = shingle_hashes(text, shingle_size)
+        signature = np.full(self.num_perm, MAX_HASH, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            for start in range(0, len(hashes), SHINGLE_BLOCK):
+                block = hashes[start:start + SHINGLE_BLOCK]
+                permuted = (np.outer(self.a, block) + self.b[:, None]) % MERSENNE_PRIME & MAX_HASH
+                np.minimum(signature, permuted.min(axis=1), out=signature)
+        return signature
+
+def estimate_similarity(first: np.ndarray, second: np.ndarray) -> float:
+    """Estimate the Jaccard similarity of two documents from their signatures."""
+    return float(np.count_nonzero(first == second)) / len(first)
+
+class MinHashLSH:
+    """Thread-safe LSH index of MinHash signatures keyed by document path.
+
+    At most max_documents documents are indexed. Signatures are also kept by
+    a hash of the text they were computed from, so indexing text seen before,
+    such as a cached extraction, skips the MinHash computation.
+    """
+
+    def __init__(self, num_perm: int = DEFAULT_NUM_PERM, bands: int = DEFAULT_BANDS,
+                 max_documents: int = DEFAULT_MAX_DOCUMENTS):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+        self.hasher = MinHasher(num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_documents = max_documents
+        self.signatures: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.text_signatures: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self.buckets: List[Dict[bytes, Set[str]]] = [{} for _ in range(bands)]
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def signature(self, text: str) -> np.ndarray:
+        """The signature of text, reused if the same text was signed before."""
+        digest = hashlib.sha256(text.encode("utf-8", "surrogatepass")).digest()
+        with self.lock:
+            signature = self.text_signatures.get(digest)
+            if signature is not None:
+                self.text_signatures.move_to_end(digest)
+                return signature
+        signature = self.hasher.signature(text)
+        with self.lock:
+            self.text_signatures[digest] = signature
+            while len(self.text_signatures) > self.max_documents:
+                self.text_signatures.popitem(last=False)
+        return signature
+
+    def add(self, key: str, text: str) -> np.ndarray:
+        """Index (or re-index) a document and return its signature."""
+        signature = self.signature(text)
+        self.insert(key, signature)
+        return signature
+
+    def insert(self, key: str, signature: np.ndarray):
+        """Index a precomputed signature from a hasher with the same parameters."""
+        with self.lock:
+            self._remove_locked(key)
+            self.signatures[key] = signature
+            for band, band_key in zip(self.buckets, self._band_keys(signature)):
+                band.setdefault(band_key, set()).add(key)
+            while len(self.signatures) > self.max_documents:
+                self._remove_locked(next(iter(self.signatures)))
+                self.evictions += 1
+
+    def get_signature(self, key: str) -> Optional[np.ndarray]:
+        with self.lock:
+            return self.signatures.get(key)
+
+    def remove(self, key: str):
+        with self.lock:
+            self._remove_locked(key)
+
+    def _remove_locked(self, key: str):
+        signature = self.signatures.pop(key, None)
+        if signature is None:
+            return
+        for band, band_key in zip(self.buckets, self._band_keys(signature)):
+            members = band.get(band_key)
+            if members is not None:
+                members.discard(key)
+                if not members:
+                    del band[band_key]
+
+    def query(self, signature: np.ndarray, threshold: float = DEFAULT_THRESHOLD,
+              exclude: Optional[str] = None) -> List[Tuple[str, float]]:
+        """Return (key, similarity) pairs at or above threshold, most similar first."""
+        with self.lock:
+            candidates: Set[str] = set()
+            for band, band_key in zip(self.buckets, self._band_keys(signature)):
+                candidates.update(band.get(band_key, ()))
+            candidates.discard(exclude)
+            scored = [(key, estimate_similarity(signature, self.signatures[key])) for key in candidates]
+        matches = [(key, score) for key, score in scored if score >= threshold]
+        matches.sort(key=lambda match: match[1], reverse=True)
+        logging.info(f"LSH query found {len(candidates)} candidates, {len(matches)} above {threshold}")
+        return matches
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+# Index of the documents most recently extracted in text mode.
+index = MinHashLSH()
@@ -0,0 +1,152 @@
+"""
+Recursive extraction of embedded documents: attachments of emails, objects
+embedded in office documents, files inside archives and so on.
+
+Instead of letting Tika flatten every embedded document into the text of its
+container, each document is unpacked one level at a time through Tika's
+/unpack endpoint and its children are extracted concurrently. The result is
+a tree with the metadata and content of every node. Each node's own
+extraction is cached by content hash, so an attachment that appears many
+times is only parsed once. Depth, document count and byte limits guard
+against zip bombs.
+"""
+
+import asyncio
+import io
+import logging
+import os
+import threading
+import traceback
+import zipfile
+from typing import List, Tuple
+from app.cache import content_hash, make_key, result_cache
+from app.model import read_file_bytes
+from app.profiles import DEFAULT_PROFILE, profile_headers
+from app.singleflight import extractions
+from app.tika_client import extract_metadata, request_unpack
+
+DEFAULT_MAX_DEPTH = 5
+DEFAULT_MAX_DOCUMENTS = 500
+DEFAULT_MAX_TOTAL_SIZE = 512 * 1024 * 1024
+DEFAULT_CONCURRENCY = 4
+
+class EmbeddedLimitExceeded(Exception):
+    """Raised when a document tree has more documents or bytes than allowed."""
+
+class _Budget:
+    """Document and byte allowance shared by every node of one tree."""
+
+    def __init__(self, max_documents: int, max_total_size: int):
+        self.documents_left = max_documents
+        self.bytes_left = max_total_size
+        self.truncated = set()
+        self.lock = threading.Lock()
+
+    def take(self, name: str, size: int):
+        with self.lock:
+            if self.documents_left <= 0:
+                raise EmbeddedLimitExceeded("Document tree has more embedded documents than allowed")
+            if size > self.bytes_left:
+                raise EmbeddedLimitExceeded(f"Document tree exceeds the size limit at {name}")
+            self.documents_left -= 1
+            self.bytes_left -= size
+
+def _unpack(file_bytes: bytes, tika_url: str, headers: dict, budget: _Budget) -> List[Tuple[str, bytes]]:
+    """Return (name, bytes) for each direct child of a document, within budget.
+
+    Children that would exceed the budget are dropped and the reason is
+    recorded in budget.truncated.
+    """
+    packed = request_unpack(file_bytes, tika_url, headers, max_bytes=budget.bytes_left)
+    if not packed:
+        return []
+    children = []
+    with zipfile.ZipFile(io.BytesIO(packed)) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            try:
+                budget.take(info.filename, info.file_size)
+                with archive.open(info) as stream:
+                    # Read one byte past the declared size, so a zip entry that
+                    # under-reports its size is caught.
+                    data = stream.read(info.file_size + 1)
+                if len(data) > info.file_size:
+                    raise EmbeddedLimitExceeded(f"Embedded document {info.filename} is larger than declared")
+            except EmbeddedLimitExceeded as e:
+                logging.warning(f"Not extracting further embedded documents: {e}")
+                budget.truncated.add(str(e))
+                break
+            children.append((info.filename, data))
+    return children
+
+async def extract_embedded(file_path: str, tika_url: str, max_depth: int = DEFAULT_MAX_DEPTH,
+                           max_documents: int = DEFAULT_MAX_DOCUMENTS,
+                           max_total_size: int = DEFAULT_MAX_TOTAL_SIZE,
+                           concurrency: int = DEFAULT_CONCURRENCY, profile: str = DEFAULT_PROFILE) -> dict:
+    """Extract a document and, recursively, every document embedded in it.
+
+    Returns {"tree": node, "documents": count} where each node holds its name,
+    hash, size, depth, metadata and content (without that of its children),
+    plus "children" when it was unpacked. Documents at max_depth are not
+    unpacked. If a limit is hit, the documents read so far are still returned
+    and the result lists the reasons under "truncated".
+    """
+    logging.info(f"extract_embedded called with file_path: {file_path}, tika_url: {tika_url}")
+    file_bytes = await asyncio.to_thread(read_file_bytes, file_path)
+    # The container's own content must not repeat its children's, and /unpack
+    # must not be told to skip the very documents it is asked for.
+    own_headers = dict(profile_headers(profile), **{"X-Tika-Skip-Embedded": "true"})
+    unpack_headers = {k: v for k, v in profile_headers(profile).items() if k != "X-Tika-Skip-Embedded"}
+    budget = _Budget(max_documents, max_total_size)
+    budget.take(file_path, len(file_bytes))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def extract_own(digest: str, data: bytes) -> dict:
+        key = make_key(digest, mode="embedded", profile=profile)
+        result = result_cache.get(key)
+        if result is not None:
+            return result
+
+        async def extract_and_cache() -> dict:
+            metadata, content = await asyncio.to_thread(extract_metadata, data, tika_url, own_headers)
+            extracted = {"metadata": metadata, "content": content}
+            result_cache.put(key, extracted)
+            return extracted
+
+        return await extractions.do(key, extract_and_cache)
+
+    async def extract_node(name: str, data: bytes, depth: int) -> dict:
+        digest = content_hash(data)
+        node = {"name": name, "hash": digest, "size": len(data), "depth": depth}
+        children = []
+        # The slot is released before the children start, so nested nodes
+        # cannot starve their parents of slots.
+        async with semaphore:
+            try:
+                node.update(await extract_own(digest, data))
+            except Exception as e:
+                logging.error(f"Error extracting embedded document {name}: {e}")
+                node["error"] = str(e)
+            if depth < max_depth:
+                try:
+                    children = await asyncio.to_thread(_unpack, data, tika_url, unpack_headers, budget)
+                except Exception as e:
+                    logging.error(f"Error unpacking {name}: {e}")
+                    node["unpack_error"] = str(e)
+        if children:
+            node["children"] = await asyncio.gather(
+                *(extract_node(child_name, child_data, depth + 1) for child_name, child_data in children))
+        return node
+
+    try:
+        tree = await extract_node(os.path.basename(file_path), file_bytes, 0)
+    except Exception as e:
+        logging.error(f"Error in extract_embedded: {e}")
+        logging.error(traceback.format_exc())
+        return {"error": str(e)}
+
+    response = {"tree": tree, "documents": max_documents - budget.documents_left}
+    if budget.truncated:
+        response["truncated"] = sorted(budget.truncated)
+    return response
@@ -0,0 +1,138 @@
+"""
+Local preprocessing of images before they are uploaded to Tika for OCR.
+
+Phone photos and high-DPI scans are far larger than OCR needs. Images are
+converted to grayscale, downscaled to a target resolution and optionally
+deskewed, then re-encoded: JPEG sources as grayscale JPEG, since photos grow
+when stored losslessly, and everything else as PNG. Non-image inputs are left
+untouched.
+"""
+
+import io
+import logging
+import os
+from typing import Optional, Tuple
+import numpy as np
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+DEFAULT_TARGET_DPI = int(os.environ.get("TIKA_IMAGE_TARGET_DPI", 300))
+# Longest side, in pixels, for images without a usable DPI (roughly A4 at 300 DPI).
+DEFAULT_MAX_DIMENSION = int(os.environ.get("TIKA_IMAGE_MAX_DIMENSION", 3508))
+PREPROCESS_IMAGES = os.environ.get("TIKA_IMAGE_PREPROCESS", "1").lower() in ("1", "true", "yes")
+
+IMAGE_FORMATS = {"PNG", "JPEG", "TIFF", "BMP", "WEBP", "GIF"}
+
+# Deskew searches this range of angles, in degrees, on a small thumbnail.
+DESKEW_MAX_ANGLE = 5.0
+DESKEW_STEP = 0.5
+DESKEW_THUMBNAIL = 800
+# Quality of re-encoded JPEG sources; high enough that OCR accuracy holds.
+JPEG_QUALITY = 90
+
+def _estimate_skew(image: Image.Image) -> float:
+    """Estimate the text skew angle with a projection-profile search.
+
+    Horizontal text lines give the sharpest row profile when level, so the
+    angle whose rotation maximises the variance of the row sums wins.
+    """
+    thumbnail = image.copy()
+    thumbnail.thumbnail((DESKEW_THUMBNAIL, DESKEW_THUMBNAIL))
+    inverted = ImageOps.invert(thumbnail)
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-DESKEW_MAX_ANGLE, DESKEW_MAX_ANGLE + DESKEW_STEP / 2, DESKEW_STEP):
+        rotated = np.asarray(inverted.rotate(float(angle), resample=Image.BILINEAR, fillcolor=0), dtype=np.float32)
+        score = float(rotated.sum(axis=1).var())
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+def is_image(file_bytes: bytes) -> bool:
+    """Whether preprocess_image would handle file_bytes as an image."""
+    try:
+        image = Image.open(io.BytesIO(file_bytes))
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        return False
+    return image.format in IMAGE_FORMATS and getattr(image, "n_frames", 1) <= 1
+
+def preprocess_image(file_bytes: bytes, target_dpi: int = DEFAULT_TARGET_DPI,
+                     max_dimension: int = DEFAULT_MAX_DIMENSION,
+                     deskew: bool = False) -> Optional[Tuple[bytes, dict]]:
+    """Shrink an image for OCR.
+
+    Returns the bytes to upload and a stats dict, or None when file_bytes is
+    not an image or has too many pixels to decode safely. The original bytes are returned unchanged if preprocessing
+    would not make them smaller.
+    """
+    try:
+        image = Image.open(io.BytesIO(file_bytes))
+        image_format = image.format
+    except (UnidentifiedImageError, OSError):
+        return None
+    except Image.DecompressionBombError as e:
+        # Decoding it would exhaust memory; Tika gets the original bytes.
+        logging.warning(f"Not preprocessing image: {e}")
+        return None
+    if image_format not in IMAGE_FORMATS or getattr(image, "n_frames", 1) > 1:
+        # Multi-page TIFFs and animations would lose every frame but the first.
+        return None
+
+    original_size = image.size
+    dpi = image.info.get("dpi", (0, 0))[0] or 0
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ("RGBA", "LA", "P"):
+        # Flatten transparency onto white so transparent text backgrounds do
+        # not turn black in grayscale.
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image.convert("RGBA"), mask=image.convert("RGBA").getchannel("A"))
+        image = background
+    image = image.convert("L")
+
+    scale = 1.0
+    if dpi and dpi > target_dpi:
+        scale = target_dpi / dpi
+    longest = max(image.size)
+    if longest * scale > max_dimension:
+        scale = max_dimension / longest
+    if scale < 1.0:
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        image = image.resize(size, resample=Image.LANCZOS)
+
+    angle = 0.0
+    if deskew:
+        angle = _estimate_skew(image)
+        if angle:
+            image = image.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+
+    output = io.BytesIO()
+    effective_dpi = round(dpi * scale) if dpi else None
+    save_options = {"optimize": True}
+    if effective_dpi:
+        save_options["dpi"] = (effective_dpi, effective_dpi)
+    output_format = "JPEG" if image_format == "JPEG" else "PNG"
+    if output_format == "JPEG":
+        save_options["quality"] = JPEG_QUALITY
+    image.save(output, format=output_format, **save_options)
+    processed = output.getvalue()
+
+    stats = {
+        "original_bytes": len(file_bytes),
+        "original_pixels": list(original_size),
+        "scale": round(scale, 4),
+        "deskew_angle": angle,
+    }
+    if len(processed) >= len(file_bytes):
+        # A rescaled or deskewed image is not worth a larger upload.
+        logging.info("Image preprocessing did not reduce the upload; sending the original")
+        stats.update({"processed_bytes": len(file_bytes), "processed_pixels": list(original_size),
+                      "bytes_saved": 0, "applied": False})
+        return file_bytes, stats
+
+    stats.update({
+        "processed_bytes": len(processed),
+        "processed_pixels": list(image.size),
+        "processed_format": output_format,
+        "bytes_saved": len(file_bytes) - len(processed),
+        "applied": True,
+    })
+    logging.info(f"Preprocessed {image_format} image: {stats}")
+    return processed, stats
@@ -0,0 +1,284 @@
+"""
+Durable asynchronous extraction jobs.
+
+Extractions submitted as jobs are stored in SQLite and drained by a pool of
+worker tasks, so callers can poll for long OCR jobs instead of holding a
+request open past their client's timeout. Failed attempts are retried with
+backoff, finished results are kept until they expire, and jobs that were
+queued or running when the server stopped are picked up again on start. A
+job whose last attempt was cut off by a crash fails instead, so a document
+that brings the server down is not retried forever.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Optional, Tuple
+from app import model
+
+JOB_DB = os.environ.get("TIKA_JOB_DB", "tika_jobs.db")
+DEFAULT_WORKERS = int(os.environ.get("TIKA_JOB_WORKERS", 2))
+DEFAULT_MAX_ATTEMPTS = int(os.environ.get("TIKA_JOB_MAX_ATTEMPTS", 3))
+# Seconds a finished or failed job, and its result, are kept.
+DEFAULT_RESULT_TTL = float(os.environ.get("TIKA_JOB_RESULT_TTL", 24 * 3600))
+# Idle workers check for due retries this often.
+POLL_INTERVAL = 1.0
+PURGE_INTERVAL = 60.0
+MAX_RETRY_DELAY = 300.0
+CRASHED_ERROR = "The server crashed during extraction"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    request TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    next_attempt_at REAL NOT NULL,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_due ON jobs (status, next_attempt_at, created_at);
+"""
+
+class JobStore:
+    """SQLite-backed job table. Every method is synchronous and thread-safe."""
+
+    def __init__(self, path: str = JOB_DB):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+
+    def add(self, request: dict) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                "INSERT INTO jobs (id, status, request, created_at, next_attempt_at) VALUES (?, 'queued', ?, ?, ?)",
+                (job_id, json.dumps(request), now, now))
+        return job_id
+
+    def get(self, job_id: str) -> Optional[sqlite3.Row]:
+        with self.lock:
+            return self.connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+    def claim(self) -> Optional[sqlite3.Row]:
+        """Mark the oldest due queued job as running and return it."""
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' AND next_attempt_at <= ? "
+                "ORDER BY created_at LIMIT 1", (now,)).fetchone()
+            if row is None:
+                return None
+            self.connection.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, attempts = attempts + 1 WHERE id = ?",
+                (now, row["id"]))
+            return row
+
+    def finish(self, job_id: str, result: dict, ttl: float):
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                "UPDATE jobs SET status = 'done', result = ?, error = NULL, finished_at = ?, expires_at = ? "
+                "WHERE id = ?", (json.dumps(result), now, now + ttl, job_id))
+
+    def retry(self, job_id: str, error: str, delay: float):
+        with self.lock:
+            self.connection.execute(
+                "UPDATE jobs SET status = 'queued', error = ?, next_attempt_at = ? WHERE id = ?",
+                (error, time.time() + delay, job_id))
+
+    def fail(self, job_id: str, error: str, ttl: float):
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, expires_at = ? WHERE id = ?",
+                (error, now, now + ttl, job_id))
+
+    def release(self, job_id: str):
+        """Put a job cut off by a shutdown back in the queue, without counting
+        the attempt."""
+        with self.lock:
+            self.connection.execute(
+                "UPDATE jobs SET status = 'queued', attempts = attempts - 1, next_attempt_at = ? "
+                "WHERE id = ? AND status = 'running'", (time.time(), job_id))
+
+    def requeue_running(self, max_attempts: int, ttl: float) -> Tuple[int, int]:
+        """Put jobs interrupted by a crash back in the queue, or fail them if
+        that was their last attempt. Returns the jobs requeued and failed."""
+        now = time.time()
+        with self.lock:
+            failed = self.connection.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, expires_at = ? "
+                "WHERE status = 'running' AND attempts >= ?", (CRASHED_ERROR, now, now + ttl, max_attempts)).rowcount
+            requeued = self.connection.execute(
+                "UPDATE jobs SET status = 'queued', next_attempt_at = ? WHERE status = 'running'", (now,)).rowcount
+        return requeued, failed
+
+    def purge_expired(self) -> int:
+        with self.lock:
+            return self.connection.execute(
+                "DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),)).rowcount
+
+    def stats(self) -> dict:
+        now = time.time()
+        with self.lock:
+            counts = dict(self.connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            oldest_queued, = self.connection.execute(
+                "SELECT MIN(created_at) FROM jobs WHERE status = 'queued'").fetchone()
+            oldest_running, = self.connection.execute(
+                "SELECT MIN(started_at) FROM jobs WHERE status = 'running'").fetchone()
+        return {
+            "queued": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "done": counts.get("done", 0),
+            "failed": counts.get("failed", 0),
+            "oldest_queued_age": now - oldest_queued if oldest_queued else 0.0,
+            "oldest_running_age": now - oldest_running if oldest_running else 0.0,
+        }
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+class JobQueue:
+    """Worker pool draining a JobStore with model.extract_file_content."""
+
+    def __init__(self, path: str = JOB_DB, workers: int = DEFAULT_WORKERS,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS, result_ttl: float = DEFAULT_RESULT_TTL):
+        self.path = path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.result_ttl = result_ttl
+        self.store: Optional[JobStore] = None
+        self.tasks = []
+        self.wakeup: Optional[asyncio.Event] = None
+        self.retries = 0
+
+    def _ensure_store(self) -> JobStore:
+        if self.store is None:
+            self.store = JobStore(self.path)
+        return self.store
+
+    async def start(self):
+        """Start the workers, resuming jobs left unfinished by a previous run."""
+        store = await asyncio.to_thread(self._ensure_store)
+        resumed, failed = await asyncio.to_thread(store.requeue_running, self.max_attempts, self.result_ttl)
+        if resumed:
+            logging.info(f"Resuming {resumed} interrupted extraction jobs")
+        if failed:
+            logging.error(f"Failing {failed} extraction jobs that crashed the server on their last attempt")
+        self.wakeup = asyncio.Event()
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self.tasks.append(asyncio.create_task(self._purge()))
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        if self.store is not None:
+            # Workers put the jobs they were running back in the queue.
+            self.store.close()
+            self.store = None
+
+    async def submit(self, request: dict) -> str:
+        job_id = await asyncio.to_thread(self._ensure_store().add, request)
+        if self.wakeup is not None:
+            self.wakeup.set()
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[sqlite3.Row]:
+        return await asyncio.to_thread(self._ensure_store().get, job_id)
+
+    async def _next_job(self) -> sqlite3.Row:
+        while True:
+            try:
+                job = await asyncio.to_thread(self.store.claim)
+            except Exception as e:
+                logging.error(f"Error claiming an extraction job: {e}")
+                job = None
+            if job is not None:
+                return job
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self):
+        while True:
+            job = await self._next_job()
+            attempt = job["attempts"] + 1
+            logging.info(f"Running extraction job {job['id']} (attempt {attempt})")
+            try:
+                result = await model.extract_file_content(**json.loads(job["request"]))
+                error = result.get("error")
+            except asyncio.CancelledError:
+                # Stopping is not the job's fault; it runs again next start.
+                self.store.release(job["id"])
+                raise
+            except Exception as e:
+                result, error = None, str(e)
+            try:
+                await self._record(job["id"], attempt, result, error)
+            except Exception as e:
+                # The job stays marked running and is resumed on the next start.
+                logging.error(f"Could not record the outcome of extraction job {job['id']}: {e}")
+
+    async def _record(self, job_id: str, attempt: int, result: Optional[dict], error: Optional[str]):
+        if error is None:
+            await asyncio.to_thread(self.store.finish, job_id, result, self.result_ttl)
+        elif attempt < self.max_attempts:
+            delay = min(MAX_RETRY_DELAY, 2 ** attempt)
+            logging.warning(f"Extraction job {job_id} failed, retrying in {delay}s: {error}")
+            await asyncio.to_thread(self.store.retry, job_id, error, delay)
+            self.retries += 1
+        else:
+            logging.error(f"Extraction job {job_id} failed after {attempt} attempts: {error}")
+            await asyncio.to_thread(self.store.fail, job_id, error, self.result_ttl)
+
+    async def _purge(self):
+        while True:
+            try:
+                purged = await asyncio.to_thread(self.store.purge_expired)
+                if purged:
+                    logging.info(f"Purged {purged} expired extraction jobs")
+            except Exception as e:
+                logging.error(f"Error purging expired jobs: {e}")
+            await asyncio.sleep(PURGE_INTERVAL)
+
+    def stats(self) -> dict:
+        """Job counts by status, the age in seconds of the oldest queued and
+        running jobs, the number of workers and the retries so far."""
+        if self.store is None:
+            return {"workers": 0, "retries": self.retries}
+        workers = sum(1 for task in self.tasks[:self.workers] if not task.done())
+        return dict(self.store.stats(), workers=workers, retries=self.retries)
+
+def describe(job: sqlite3.Row) -> dict:
+    """Public view of a job, without its request or result."""
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "expires_at": job["expires_at"],
+        "error": job["error"],
+    }
+
+queue = JobQueue()
@@ -1,8 +1,21 @@
+import asyncio
+import os
 import sys
 import traceback
 import json
-from mcp.server.fastmcp import FastMCP
-from app.model import extract_file_content
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from mcp.server.fastmcp import Context, FastMCP
+from app import archive, concurrency, dedup, embedded, jobs, tabular
+from app.cache import result_cache
+from app.cluster import cluster
+from app.image_preprocess import PREPROCESS_IMAGES
+from app.metrics import latency
+from app.profiles import DEFAULT_PROFILE
+from app.prefetch import prefetcher
+from app.singleflight import extractions
+from app import model
+from app.model import extract_file_content, extract_files as extract_files_content, find_near_duplicates as find_near_duplicate_files
 
 # Set up logging to a file
 import logging
@@ -14,8 +27,20 @@ logging.basicConfig(
 
 print("Creating FastMCP server...")
 logging.info("Creating FastMCP server...")
+@asynccontextmanager
+async def lifespan(server: FastMCP):
+    # Job workers run for the lifetime of the server and pick up jobs left
+    # unfinished by the previous run.
+    cluster.start(asyncio.get_running_loop(), model.extract_for_peer)
+    await jobs.queue.start()
+    try:
+        yield {}
+    finally:
+        cluster.stop()
+        await jobs.queue.stop()
+
 try:
-    mcp = FastMCP("tika")
+    mcp = FastMCP("tika", lifespan=lifespan)
     print("FastMCP server created.")
     logging.info("FastMCP server created.")
 except Exception as e:
@@ -26,18 +51,49 @@ except Exception as e:
     sys.exit(1)
 
 @mcp.tool()
-async def extract_file(file_path: str, tika_url: str) -> dict:
+async def extract_file(file_path: str, tika_url: str, mode: str = "text",
+                       block_types: Optional[List[str]] = None, postprocess: bool = False,
+                       preprocess_images: bool = PREPROCESS_IMAGES, deskew: bool = False,
+                       profile: str = DEFAULT_PROFILE, pages: Optional[str] = None, stream: bool = False,
+                       ctx: Context = None) -> dict:
     """Extract content and metadata from a file using Tika.
 
     Args:
         file_path: Path to the file.
         tika_url: URL of the running Tika server.
+        mode: "text" for plain text, or "structured" for typed page, heading,
+            paragraph and table blocks with character offsets.
+        block_types: In structured mode, only return blocks of these types.
+        postprocess: In text mode, join hyphenated line breaks, drop repeated
+            page headers and footers and normalise whitespace.
+        preprocess_images: Convert images to grayscale and downscale them to
+            the target resolution before OCR. Disable for fidelity-critical jobs.
+        deskew: Also straighten skewed scans during image preprocessing.
+        profile: Extraction profile: "fast" (text layer only, no OCR or
+            embedded documents), "balanced", "thorough" (OCR everything) or
+            "default" (Tika's own configuration).
+        pages: Only extract these 1-based pages, e.g. "40-45" or "1,3,7-9".
+            Supported for PDFs and for formats Tika marks pages in, with
+            presentation slides counting as pages. Word processing documents
+            and plain text have no pages and return an error.
+        stream: In text mode, send the text as it arrives from Tika in
+            progress notifications (when the request has a progress token)
+            before returning the full result.
     """
-    print(f"extract_file tool called with file_path: {file_path}, tika_url: {tika_url}")
-    logging.info(f"extract_file tool called with file_path: {file_path}, tika_url: {tika_url}")
+    print(f"extract_file tool called with file_path: {file_path}, tika_url: {tika_url}, mode: {mode}")
+    logging.info(f"extract_file tool called with file_path: {file_path}, tika_url: {tika_url}, mode: {mode}")
     try:
-        result = await extract_file_content(file_path, tika_url)
+        on_text = None
+        if stream and ctx is not None:
+            async def on_text(text: str, received: int):
+                # Progress counts characters received; the total is unknown.
+                await ctx.report_progress(received, message=text)
+
+        result = await extract_file_content(file_path, tika_url, mode, block_types, postprocess,
+                                            preprocess_images, deskew, profile, pages, on_text=on_text)
         logging.info(f"extract_file_content returned: {result}")
+        prefetcher.schedule(file_path, tika_url, mode=mode, block_types=block_types, postprocess=postprocess,
+                            preprocess_images=preprocess_images, deskew=deskew, profile=profile)
         return result
     except Exception as e:
         print(f"Error in extract_file: {e}")
@@ -46,6 +102,232 @@ async def extract_file(file_path: str, tika_url: str) -> dict:
         logging.error(traceback.format_exc())
         return {"error": str(e)}
 
+@mcp.tool()
+async def extract_files(file_paths: List[str], tika_url: str, mode: str = "text",
+                        block_types: Optional[List[str]] = None, collapse_duplicates: bool = False,
+                        threshold: float = dedup.DEFAULT_THRESHOLD, postprocess: bool = False,
+                        profile: str = DEFAULT_PROFILE, pages: Optional[str] = None,
+                        batch_small_files: bool = True) -> dict:
+    """Extract content and metadata from several files concurrently.
+
+    Args:
+        file_paths: Paths to the files.
+        tika_url: URL of the running Tika server.
+        mode: "text" or "structured", as for extract_file.
+        block_types: In structured mode, only return blocks of these types.
+        collapse_duplicates: Replace the content of files that are near
+            duplicates of an earlier file in the batch with a reference to it.
+        threshold: Estimated Jaccard similarity above which files count as
+            near duplicates.
+        postprocess: Post-process text as for extract_file.
+        profile: Extraction profile, as for extract_file.
+        pages: Page ranges to extract from every file, as for extract_file.
+        batch_small_files: In text mode, send small files to Tika in shared
+            requests. Results are the same as with per-file requests.
+    """
+    logging.info(f"extract_files tool called with {len(file_paths)} files, tika_url: {tika_url}")
+    try:
+        return await extract_files_content(file_paths, tika_url, mode, block_types, collapse_duplicates, threshold,
+                                           postprocess, profile, pages, batch_small_files)
+    except Exception as e:
+        logging.error(f"Error in extract_files: {e}")
+        logging.error(traceback.format_exc())
+        return {"error": str(e)}
+
+@mcp.tool()
+async def find_near_duplicates(file_path: str, tika_url: str, search_paths: Optional[List[str]] = None,
+                               threshold: float = dedup.DEFAULT_THRESHOLD) -> dict:
+    """Find previously extracted files whose text is a near duplicate of a file.
+
+    Args:
+        file_path: Path to the file.
+        tika_url: URL of the running Tika server.
+        search_paths: Additional files to extract and index before searching.
+        threshold: Estimated Jaccard similarity above which files count as
+            near duplicates.
+    """
+    logging.info(f"find_near_duplicates tool called with file_path: {file_path}, tika_url: {tika_url}")
+    return await find_near_duplicate_files(file_path, tika_url, search_paths, threshold)
+
+@mcp.tool()
+async def extract_archive(file_path: str, tika_url: str, max_members: int = archive.DEFAULT_MAX_MEMBERS,
+                          max_total_size: int = archive.DEFAULT_MAX_TOTAL_SIZE,
+                          concurrency: int = archive.DEFAULT_CONCURRENCY) -> dict:
+    """Extract content and metadata from each member of a zip or tar archive.
+
+    Args:
+        file_path: Path to the archive.
+        tika_url: URL of the running Tika server.
+        max_members: Stop after this many members.
+        max_total_size: Stop once members add up to this many uncompressed bytes.
+        concurrency: Number of members extracted in parallel.
+    """
+    logging.info(f"extract_archive tool called with file_path: {file_path}, tika_url: {tika_url}")
+    try:
+        return await archive.extract_archive(file_path, tika_url, max_members, max_total_size, concurrency)
+    except Exception as e:
+        logging.error(f"Error in extract_archive: {e}")
+        logging.error(traceback.format_exc())
+        return {"error": str(e)}
+
+@mcp.tool()
+async def extract_embedded(file_path: str, tika_url: str, max_depth: int = embedded.DEFAULT_MAX_DEPTH,
+                           max_documents: int = embedded.DEFAULT_MAX_DOCUMENTS,
+                           max_total_size: int = embedded.DEFAULT_MAX_TOTAL_SIZE,
+                           concurrency: int = embedded.DEFAULT_CONCURRENCY,
+                           profile: str = DEFAULT_PROFILE) -> dict:
+    """Extract a document and its embedded documents (attachments, embedded
+    files, ...) recursively, returning a tree with metadata and content per node.
+
+    Args:
+        file_path: Path to the document.
+        tika_url: URL of the running Tika server.
+        max_depth: Documents nested deeper than this are not unpacked.
+        max_documents: Stop after this many documents in the tree.
+        max_total_size: Stop once documents add up to this many bytes.
+        concurrency: Number of documents extracted in parallel.
+        profile: Extraction profile (default, fast, balanced, thorough).
+    """
+    logging.info(f"extract_embedded tool called with file_path: {file_path}, tika_url: {tika_url}")
+    try:
+        return await embedded.extract_embedded(file_path, tika_url, max_depth, max_documents, max_total_size,
+                                               concurrency, profile)
+    except Exception as e:
+        logging.error(f"Error in extract_embedded: {e}")
+        logging.error(traceback.format_exc())
+        return {"error": str(e)}
+
+@mcp.tool()
+async def extract_table(file_path: str, columns: Optional[List[str]] = None, sheet: Optional[str] = None,
+                        max_rows: int = tabular.DEFAULT_MAX_ROWS, sample: Optional[int] = None,
+                        stats: bool = True, header: bool = True, seed: int = 0) -> dict:
+    """Read rows from a CSV or XLSX file as columns, instead of flattened text.
+
+    Rows are streamed locally without Tika. Values come back as one list per
+    column, with per-column statistics (counts, nulls, types, numeric
+    min/max/mean, distinct values) over every row read.
+
+    Args:
+        file_path: Path to a .csv/.tsv or .xlsx file.
+        columns: Only return these columns, by header name.
+        sheet: XLSX sheet to read (default: the first).
+        max_rows: Return at most this many rows from the top.
+        sample: Instead, return this many rows sampled uniformly from the
+            whole table, with their row numbers.
+        stats: Compute column statistics; this reads the whole table.
+        header: Whether the first row holds the column names.
+        seed: Random seed for sampling.
+    """
+    logging.info(f"extract_table tool called with file_path: {file_path}")
+    try:
+        return await asyncio.to_thread(tabular.extract_table, file_path, columns, sheet, max_rows, sample,
+                                       stats, header, seed)
+    except Exception as e:
+        logging.error(f"Error in extract_table: {e}")
+        logging.error(traceback.format_exc())
+        return {"error": str(e)}
+
+@mcp.tool()
+async def detect_type(file_paths: List[str], tika_url: str, window_bytes: int = model.DEFAULT_DETECT_WINDOW) -> dict:
+    """Detect the media type of one or more files without parsing them.
+
+    Only the leading bytes of each file are sent to Tika, together with the
+    file name as a hint.
+
+    Args:
+        file_paths: Paths to the files.
+        tika_url: URL of the running Tika server.
+        window_bytes: Number of leading bytes sent per file.
+    """
+    logging.info(f"detect_type tool called with {len(file_paths)} files, tika_url: {tika_url}")
+    try:
+        return await model.detect_types(file_paths, tika_url, window_bytes)
+    except Exception as e:
+        logging.error(f"Error in detect_type: {e}")
+        logging.error(traceback.format_exc())
+        return {"error": str(e)}
+
+@mcp.tool()
+async def get_metadata(file_paths: List[str], tika_url: str, fields: Optional[List[str]] = None,
+                       profile: str = "fast") -> dict:
+    """Fetch metadata (content type, page count, author, dates...) for one or
+    more files without extracting their text.
+
+    Args:
+        file_paths: Paths to the files.
+        tika_url: URL of the running Tika server.
+        fields: Only return these metadata keys, e.g. ["Content-Type", "xmpTPg:NPages"].
+        profile: Extraction profile; "fast" skips OCR and embedded documents.
+    """
+    logging.info(f"get_metadata tool called with {len(file_paths)} files, tika_url: {tika_url}")
+    try:
+        return await model.get_metadata(file_paths, tika_url, fields, profile)
+    except Exception as e:
+        logging.error(f"Error in get_metadata: {e}")
+        logging.error(traceback.format_exc())
+        return {"error": str(e)}
+
+@mcp.tool()
+async def submit_extraction(file_path: str, tika_url: str, mode: str = "text",
+                            block_types: Optional[List[str]] = None, postprocess: bool = False,
+                            preprocess_images: bool = PREPROCESS_IMAGES, deskew: bool = False,
+                            profile: str = DEFAULT_PROFILE, pages: Optional[str] = None) -> dict:
+    """Queue an extraction as a durable background job and return its job_id.
+
+    Use this for extractions that may outlast the client's timeout, such as
+    large OCR jobs; poll job_status and fetch the result with get_job_result.
+    Jobs survive server restarts. Arguments are as for extract_file.
+    """
+    logging.info(f"submit_extraction tool called with file_path: {file_path}, tika_url: {tika_url}")
+    try:
+        if mode not in model.EXTRACTION_MODES:
+            raise ValueError(f"Unknown extraction mode: {mode}")
+        request = dict(file_path=os.path.abspath(file_path), tika_url=tika_url, mode=mode, block_types=block_types,
+                       postprocess=postprocess, preprocess_images=preprocess_images, deskew=deskew,
+                       profile=profile, pages=pages)
+        job_id = await jobs.queue.submit(request)
+        return {"job_id": job_id, "status": "queued"}
+    except Exception as e:
+        logging.error(f"Error in submit_extraction: {e}")
+        logging.error(traceback.format_exc())
+        return {"error": str(e)}
+
+@mcp.tool()
+async def job_status(job_id: str) -> dict:
+    """Report the status of an extraction job: queued, running, done or failed.
+
+    Args:
+        job_id: ID returned by submit_extraction.
+    """
+    job = await jobs.queue.get(job_id)
+    if job is None:
+        return {"error": f"Unknown or expired job: {job_id}"}
+    return jobs.describe(job)
+
+@mcp.tool()
+async def get_job_result(job_id: str) -> dict:
+    """Return the result of a finished extraction job, as extract_file would.
+
+    Args:
+        job_id: ID returned by submit_extraction.
+    """
+    job = await jobs.queue.get(job_id)
+    if job is None:
+        return {"error": f"Unknown or expired job: {job_id}"}
+    if job["status"] == "done":
+        return json.loads(job["result"])
+    if job["status"] == "failed":
+        return {"error": job["error"], "job_id": job_id, "status": "failed"}
+    return dict(jobs.describe(job), error=f"Job {job_id} is not finished yet")
+
+@mcp.tool()
+async def get_stats() -> dict:
+    """Report result cache, prefetcher, request coalescing, latency, Tika
+    concurrency, job queue and cluster statistics."""
+    return {"cache": result_cache.stats(), "prefetch": prefetcher.stats(),
+            "coalescing": extractions.stats(), "latency": latency.stats(),
+            "concurrency": concurrency.stats(), "jobs": jobs.queue.stats(), "cluster": cluster.stats()}
+
 if __name__ == "__main__":
     print("Running MCP server with stdio transport...")
     logging.info("Running MCP server with stdio transport...")
@@ -0,0 +1,49 @@
+"""
+Latency metrics for the stats surface.
+
+Recent samples are kept per series in a bounded window, which is enough for
+percentiles that track current behaviour without growing with uptime.
+"""
+
+import threading
+from collections import deque
+from typing import Deque, Dict
+
+WINDOW_SIZE = 1024
+
+def _percentile(ordered: list, fraction: float) -> float:
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+class LatencyRecorder:
+    """Thread-safe recorder of latency samples, grouped by series name."""
+
+    def __init__(self, window_size: int = WINDOW_SIZE):
+        self.window_size = window_size
+        self.samples: Dict[str, Deque[float]] = {}
+        self.counts: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def record(self, series: str, seconds: float):
+        with self.lock:
+            if series not in self.samples:
+                self.samples[series] = deque(maxlen=self.window_size)
+                self.counts[series] = 0
+            self.samples[series].append(seconds)
+            self.counts[series] += 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            snapshot = {series: (sorted(samples), self.counts[series]) for series, samples in self.samples.items()}
+        return {
+            series: {
+                "count": count,
+                "mean": sum(ordered) / len(ordered),
+                "p50": _percentile(ordered, 0.5),
+                "p95": _percentile(ordered, 0.95),
+                "max": ordered[-1],
+            }
+            for series, (ordered, count) in snapshot.items()
+        }
+
+latency = LatencyRecorder()
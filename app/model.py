@@ -1,33 +1,526 @@
 import asyncio
+import os
+import threading
+import time
 import traceback
 import logging
-from app.tika_client import extract_metadata
+from typing import Dict, List, Optional
+from app import batching, dedup
+from app.cluster import cluster
+from app.image_preprocess import PREPROCESS_IMAGES, is_image, preprocess_image
+from app.metrics import latency
+from app.profiles import DEFAULT_PROFILE, profile_headers
+from app.cache import content_hash, make_key, result_cache
+from app.singleflight import extractions
+from app.pages import parse_page_ranges, slice_pdf
+from app.postprocess import postprocess_text_async
+from app.concurrency import limited
+from app.tika_client import detect_type, extract_metadata, is_overload, iter_text, open_stream, request_metadata
+from app.xhtml_blocks import extract_blocks, extract_paged_text
 
-async def extract_file_content(file_path: str, tika_url: str) -> dict:
-    print(f"extract_file_content called with file_path: {file_path}, tika_url: {tika_url}")
-    logging.info(f"extract_file_content called with file_path: {file_path}, tika_url: {tika_url}")
+EXTRACTION_MODES = ("text", "structured")
+
+# Leading bytes sent for type detection; enough for Tika's magic patterns.
+DEFAULT_DETECT_WINDOW = 64 * 1024
+# Files triaged in parallel by detect_types and get_metadata.
+DEFAULT_TRIAGE_CONCURRENCY = 16
+
+# Streamed text is passed on in chunks of at least this many characters, or
+# whatever has arrived after STREAM_INTERVAL seconds.
+STREAM_CHUNK_CHARS = int(os.environ.get("TIKA_STREAM_CHUNK_CHARS", 8192))
+STREAM_INTERVAL = 0.5
+
+# Number of foreground extractions in flight and when the last one finished.
+# Background work such as prefetching only runs while the server is idle.
+_active_requests = 0
+_last_request_end = 0.0
+
+# Near-duplicate indexing of extracted text runs after the result has been
+# returned; find_near_duplicates waits here for the documents it needs.
+_indexing: Dict[str, asyncio.Future] = {}
+
+def _index_in_background(key: str, text: str):
+    task = asyncio.ensure_future(asyncio.to_thread(dedup.index.add, key, text))
+    _indexing[key] = task
+
+    def finished(done: asyncio.Future):
+        if _indexing.get(key) is done:
+            del _indexing[key]
+        if not done.cancelled() and done.exception() is not None:
+            logging.error(f"Error indexing {key} for near-duplicate detection: {done.exception()}")
+
+    task.add_done_callback(finished)
+
+async def _indexed_signature(key: str):
+    """The indexed signature of a document, once pending indexing is done."""
+    task = _indexing.get(key)
+    if task is not None:
+        await asyncio.wait([task])
+    return dedup.index.get_signature(key)
+
+def idle_seconds() -> float:
+    """Seconds since the last foreground extraction finished, 0 while one is running."""
+    if _active_requests:
+        return 0.0
+    return time.monotonic() - _last_request_end
+
+async def extract_file_content(file_path: str, tika_url: str, mode: str = "text",
+                               block_types: Optional[List[str]] = None, postprocess: bool = False,
+                               preprocess_images: bool = PREPROCESS_IMAGES, deskew: bool = False,
+                               profile: str = DEFAULT_PROFILE, pages: Optional[str] = None,
+                               background: bool = False, on_text=None) -> dict:
+    """Extract one file with Tika.
+
+    In text mode without pages, on_text(chunk, received), when given, is
+    awaited with the text as Tika produces it; received counts the characters
+    so far. Results served from the cache are returned without streaming.
+    """
+    global _active_requests, _last_request_end
+    print(f"extract_file_content called with file_path: {file_path}, tika_url: {tika_url}, mode: {mode}")
+    logging.info(f"extract_file_content called with file_path: {file_path}, tika_url: {tika_url}, mode: {mode}")
+    if not background:
+        _active_requests += 1
     try:
         logging.info("Reading file bytes...")
         file_bytes = await asyncio.to_thread(read_file_bytes, file_path)
         print(f"Read {len(file_bytes)} bytes from {file_path}")
         logging.info(f"Read {len(file_bytes)} bytes from {file_path}")
         
-        logging.info("Calling extract_metadata...")
-        metadata, content = await asyncio.to_thread(extract_metadata, file_bytes, tika_url)
-        print("extract_metadata returned successfully")
-        logging.info("extract_metadata returned successfully")
-        
+        if mode not in EXTRACTION_MODES:
+            raise ValueError(f"Unknown extraction mode: {mode}")
+
+        options = dict(mode=mode, block_types=block_types, postprocess=postprocess,
+                       preprocess_images=preprocess_images, deskew=deskew, profile=profile)
+        if pages:
+            result = await _extract_pages(file_bytes, tika_url, pages, options, background)
+        else:
+            result = await _cached_extract(file_bytes, tika_url, options, background,
+                                           on_text if mode == "text" else None)
+            # Only whole documents go into the near-duplicate index.
+            if mode == "text":
+                _index_in_background(os.path.abspath(file_path), result["content"])
+
         # Log a sample of the metadata and content
-        logging.info(f"Metadata sample: {str(metadata)[:200]}...")
-        logging.info(f"Content sample: {str(content)[:200]}...")
+        logging.info(f"Metadata sample: {str(result['metadata'])[:200]}...")
+        logging.info(f"Content sample: {str(result['content'])[:200]}...")
         
-        return {"metadata": metadata, "content": content}
+        return result
     except Exception as e:
         print(f"Error in extract_file_content: {e}")
         logging.error(f"Error in extract_file_content: {e}")
         traceback.print_exc()
         logging.error(traceback.format_exc())
         return {"error": str(e)}
+    finally:
+        if not background:
+            _active_requests -= 1
+            _last_request_end = time.monotonic()
+
+def _cache_key(digest: str, options: dict) -> str:
+    block_types = options["block_types"]
+    return make_key(digest, **dict(options, block_types=sorted(block_types) if block_types else None))
+
+async def _cached_extract(file_bytes: bytes, tika_url: str, options: dict, background: bool,
+                          on_text=None, route: bool = True) -> dict:
+    """Extract file_bytes with the given options, through the result cache.
+
+    Identical requests already in flight share one Tika call. In cluster
+    mode, documents owned by another node are extracted there, through that
+    node's cache, unless route is False.
+    """
+    headers = profile_headers(options["profile"])
+    block_types = options["block_types"]
+    digest = content_hash(file_bytes)
+    key = _cache_key(digest, options)
+    result = result_cache.get(key, background)
+    if result is not None:
+        logging.info("Serving extraction from the result cache")
+        return result
+
+    async def extract_and_cache() -> dict:
+        extracted = await _extract_bytes(file_bytes, tika_url, options["mode"], block_types, options["postprocess"],
+                                         options["preprocess_images"], options["deskew"], options["profile"], headers,
+                                         on_text)
+        result_cache.put(key, extracted, source="prefetch" if background else "request")
+        return extracted
+
+    if on_text is not None:
+        # A streaming caller needs the chunks of its own call, so it does not
+        # join one already in flight.
+        return await extract_and_cache()
+    # Background work stays local, so prefetching does not load other nodes.
+    owner = cluster.owner_for(digest) if route and not background else None
+    if owner is not None:
+        async def forward_or_extract() -> dict:
+            forwarded = await cluster.forward(owner, file_bytes, tika_url, options)
+            if forwarded is not None:
+                return forwarded
+            return await extract_and_cache()
+
+        return await extractions.do(key, forward_or_extract)
+    return await extractions.do(key, extract_and_cache)
+
+async def extract_for_peer(file_bytes: bytes, tika_url: str, options: dict) -> dict:
+    """Extract a document forwarded by another cluster node, on this node."""
+    return await _cached_extract(file_bytes, tika_url, options, background=False, route=False)
+
+async def _extract_pages(file_bytes: bytes, tika_url: str, pages: str, options: dict, background: bool) -> dict:
+    """Extract only the requested pages of a document.
+
+    PDFs are sliced locally and only the requested pages are sent to Tika.
+    Other formats fall back to a cached, page-marked structured extraction of
+    the whole document, from which the requested pages are selected; Tika
+    marks pages only for paged formats and slides for presentations.
+    """
+    requested = parse_page_ranges(pages)
+    mode = options["mode"]
+    block_types = options["block_types"]
+
+    sliced = await asyncio.to_thread(slice_pdf, file_bytes, requested)
+    if sliced is not None:
+        sliced_bytes, kept = sliced
+        result = await _cached_extract(sliced_bytes, tika_url, options, background)
+        if mode == "structured":
+            # Renumber pages of the sliced document back to the original pages,
+            # in new blocks so that the result of the shared call is untouched.
+            result["content"] = [dict(block, page=kept[block["page"] - 1])
+                                 if "page" in block and block["page"] <= len(kept) else block
+                                 for block in result["content"]]
+        result["pages"] = {"requested": pages, "returned": kept, "method": "slice"}
+        return result
+
+    full_options = dict(options, mode="structured", block_types=None, postprocess=False)
+    full = await _cached_extract(file_bytes, tika_url, full_options, background)
+    if not any(block["type"] == "page" for block in full["content"]):
+        content_type = full["metadata"].get("Content-Type", "this format")
+        raise Exception(f"Page ranges are only supported for PDFs, presentations and other paged formats, "
+                        f"not {content_type}")
+
+    wanted = set(requested)
+    selected = [block for block in full["content"] if block.get("page") in wanted]
+    returned = sorted({block["page"] for block in selected})
+    result = {"metadata": full["metadata"], "pages": {"requested": pages, "returned": returned, "method": "page_markers"}}
+    if mode == "structured":
+        result["content"] = [block for block in selected if not block_types or block["type"] in block_types]
+    else:
+        if options["postprocess"]:
+            # Form feeds between pages let post-processing find headers and
+            # footers; whitespace normalisation turns them into spaces.
+            text = "\f".join("\n".join(block["text"] for block in selected
+                                        if block["type"] != "page" and block["page"] == page)
+                             for page in returned)
+            text, result["postprocess"] = await postprocess_text_async(text)
+        else:
+            text = "\n".join(block["text"] for block in selected if block["type"] != "page")
+        result["content"] = text
+    return result
+
+async def _extract_bytes(file_bytes: bytes, tika_url: str, mode: str,
+                         block_types: Optional[List[str]], postprocess: bool,
+                         preprocess_images: bool, deskew: bool, profile: str, headers: dict,
+                         on_text=None) -> dict:
+    image_stats = None
+    if preprocess_images:
+        preprocessed = await asyncio.to_thread(preprocess_image, file_bytes, deskew=deskew)
+        if preprocessed is not None:
+            file_bytes, image_stats = preprocessed
+
+    started = time.monotonic()
+    if mode == "structured":
+        logging.info("Requesting metadata and XHTML blocks...")
+        metadata = await asyncio.to_thread(request_metadata, file_bytes, tika_url, headers)
+        content = await asyncio.to_thread(extract_blocks, file_bytes, tika_url, block_types, headers=headers)
+    elif on_text is not None:
+        # Metadata is fetched alongside, so it does not delay the first text.
+        logging.info("Streaming text while requesting metadata...")
+        metadata, content = await asyncio.gather(asyncio.to_thread(request_metadata, file_bytes, tika_url, headers),
+                                                 _stream_text(file_bytes, tika_url, headers, on_text))
+    elif postprocess:
+        # Post-processing needs the page breaks, which only the XHTML
+        # rendering has, to find repeated headers and footers.
+        logging.info("Requesting metadata and paged text...")
+        metadata = await asyncio.to_thread(request_metadata, file_bytes, tika_url, headers)
+        content = await asyncio.to_thread(extract_paged_text, file_bytes, tika_url, headers=headers)
+    else:
+        logging.info("Calling extract_metadata...")
+        metadata, content = await asyncio.to_thread(extract_metadata, file_bytes, tika_url, headers)
+        print("extract_metadata returned successfully")
+        logging.info("extract_metadata returned successfully")
+    elapsed = time.monotonic() - started
+    latency.record(f"profile:{profile}", elapsed)
+
+    result = {"metadata": metadata, "content": content}
+    if image_stats is not None:
+        # OCR cost grows roughly with the pixel count, so the time saved is
+        # estimated from the measured OCR time and the pixel reduction.
+        original_pixels = image_stats["original_pixels"][0] * image_stats["original_pixels"][1]
+        processed_pixels = image_stats["processed_pixels"][0] * image_stats["processed_pixels"][1]
+        image_stats["ocr_seconds"] = round(elapsed, 3)
+        image_stats["estimated_ocr_seconds_saved"] = round(elapsed * max(0.0, original_pixels / processed_pixels - 1), 3)
+        result["image_preprocessing"] = image_stats
+    if mode == "text" and postprocess:
+        result["content"], result["postprocess"] = await postprocess_text_async(content)
+    return result
+
+async def _stream_text(file_bytes: bytes, tika_url: str, headers: dict, on_text) -> str:
+    """Request plain text from Tika and await on_text(chunk, received) as it arrives.
+
+    Returns the whole text. If the caller is cancelled, the response is
+    closed once the next chunk arrives, which stops reading from Tika.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def produce():
+        try:
+            with limited(tika_url, is_overload):
+                with open_stream(file_bytes, tika_url, headers=headers) as response:
+                    pending = []
+                    pending_size = 0
+                    last_sent = time.monotonic()
+                    for text in iter_text(response):
+                        if stop.is_set():
+                            return
+                        pending.append(text)
+                        pending_size += len(text)
+                        if pending_size >= STREAM_CHUNK_CHARS or time.monotonic() - last_sent >= STREAM_INTERVAL:
+                            loop.call_soon_threadsafe(queue.put_nowait, "".join(pending))
+                            pending = []
+                            pending_size = 0
+                            last_sent = time.monotonic()
+                    if pending:
+                        loop.call_soon_threadsafe(queue.put_nowait, "".join(pending))
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+            return
+        loop.call_soon_threadsafe(queue.put_nowait, None)
+
+    producer = asyncio.ensure_future(asyncio.to_thread(produce))
+    parts = []
+    received = 0
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
+            parts.append(item)
+            received += len(item)
+            await on_text(item, received)
+    finally:
+        stop.set()
+    await producer
+    return "".join(parts)
+
+async def extract_files(file_paths: List[str], tika_url: str, mode: str = "text",
+                        block_types: Optional[List[str]] = None, collapse_duplicates: bool = False,
+                        threshold: float = dedup.DEFAULT_THRESHOLD, postprocess: bool = False,
+                        profile: str = DEFAULT_PROFILE, pages: Optional[str] = None,
+                        batch_small_files: bool = True) -> dict:
+    """Extract several files concurrently.
+
+    With collapse_duplicates, a text-mode result whose content is a near
+    duplicate of an earlier file in the batch is replaced by a reference to
+    that file instead of repeating the content. With batch_small_files, small
+    files in text mode are packed into shared Tika requests (see
+    app.batching); the results are the same as without.
+    """
+    logging.info(f"extract_files called with {len(file_paths)} files, collapse_duplicates: {collapse_duplicates}")
+    if batch_small_files and mode == "text" and not pages:
+        results = await _extract_files_batched(file_paths, tika_url, postprocess, profile)
+    else:
+        results = await asyncio.gather(*(extract_file_content(path, tika_url, mode, block_types, postprocess,
+                                                              profile=profile, pages=pages)
+                                         for path in file_paths))
+
+    if collapse_duplicates and mode == "text":
+        batch_index = dedup.MinHashLSH()
+        for path, result in zip(file_paths, results):
+            if "error" in result or not result.get("content"):
+                continue
+            # Sign the text actually returned, which with pages is a slice of
+            # the document rather than the whole indexed document.
+            signature = await asyncio.to_thread(dedup.index.signature, result["content"])
+            matches = batch_index.query(signature, threshold)
+            if matches:
+                original, similarity = matches[0]
+                logging.info(f"Collapsing {path} as near duplicate of {original} ({similarity:.2f})")
+                result["content"] = None
+                result["duplicate_of"] = original
+                result["similarity"] = similarity
+            else:
+                batch_index.insert(path, signature)
+
+    return {"results": [dict(result, file_path=path) for path, result in zip(file_paths, results)]}
+
+def _file_size(file_path: str) -> Optional[int]:
+    try:
+        return os.path.getsize(file_path)
+    except OSError:
+        return None
+
+async def _extract_files_batched(file_paths: List[str], tika_url: str, postprocess: bool, profile: str) -> List[dict]:
+    """Text-mode extract_files with small files extracted in shared requests.
+
+    Batch results go straight to their callers and are also put into the
+    result cache under the keys per-file extraction uses. Files a batch could
+    not handle are extracted one by one as usual.
+    """
+    sizes = await asyncio.to_thread(lambda: [_file_size(path) for path in file_paths])
+    small = [(index, size) for index, size in enumerate(sizes)
+             if size is not None and size <= batching.BATCH_MAX_FILE_SIZE]
+    # Batched text has no page breaks, which post-processing needs.
+    if (len(small) < batching.BATCH_MIN_FILES or postprocess
+            or not batching.supports_batching(profile_headers(profile))):
+        small = []
+    small_indices = {index for index, _ in small}
+    results: List[Optional[dict]] = [None] * len(file_paths)
+    semaphore = asyncio.Semaphore(batching.BATCH_CONCURRENCY)
+
+    async def extract(index: int):
+        results[index] = await extract_file_content(file_paths[index], tika_url, "text", postprocess=postprocess,
+                                                    profile=profile)
+
+    async def extract_group(indices: List[int]):
+        async with semaphore:
+            batched = await _extract_batch([file_paths[index] for index in indices], tika_url, profile)
+        for position, index in enumerate(indices):
+            if position in batched:
+                results[index] = batched[position]
+                _index_in_background(os.path.abspath(file_paths[index]), batched[position]["content"])
+        await asyncio.gather(*(extract(index) for index in indices if results[index] is None))
+
+    await asyncio.gather(*(extract_group(indices) for indices in batching.plan_batches(small)),
+                         *(extract(index) for index in range(len(file_paths)) if index not in small_indices))
+    return results
+
+async def _extract_batch(file_paths: List[str], tika_url: str, profile: str) -> Dict[int, dict]:
+    """Extract uncached small files with one Tika request.
+
+    Returns the results by position in file_paths, leaving out the files the
+    batch did not handle, and puts them into the result cache.
+    """
+    global _active_requests, _last_request_end
+    options = dict(mode="text", block_types=None, postprocess=False,
+                   preprocess_images=PREPROCESS_IMAGES, deskew=False, profile=profile)
+    results: Dict[int, dict] = {}
+    _active_requests += 1
+    try:
+        pending = []
+        for position, path in enumerate(file_paths):
+            try:
+                file_bytes = await asyncio.to_thread(read_file_bytes, path)
+            except Exception:
+                continue
+            key = _cache_key(content_hash(file_bytes), options)
+            # Images are preprocessed before upload when extracted on their own.
+            if key in result_cache or (PREPROCESS_IMAGES and is_image(file_bytes)):
+                continue
+            pending.append((position, key, file_bytes))
+        if len(pending) < 2:
+            return results
+
+        started = time.monotonic()
+        extracted = await asyncio.to_thread(batching.extract_batch, [file_bytes for _, _, file_bytes in pending],
+                                            tika_url, profile_headers(profile))
+        latency.record(f"batch:{profile}", time.monotonic() - started)
+        for (position, key, _), member in zip(pending, extracted):
+            if member is None:
+                continue
+            metadata, content = member
+            results[position] = {"metadata": metadata, "content": content}
+            result_cache.put(key, results[position])
+        logging.info(f"Batched {len(results)} of {len(pending)} small files")
+    except Exception as e:
+        # The files are extracted one by one instead.
+        logging.warning(f"Batch extraction failed, falling back to per-file requests: {e}")
+    finally:
+        _active_requests -= 1
+        _last_request_end = time.monotonic()
+    return results
+
+async def find_near_duplicates(file_path: str, tika_url: str, search_paths: Optional[List[str]] = None,
+                               threshold: float = dedup.DEFAULT_THRESHOLD) -> dict:
+    """Report indexed documents whose text is a near duplicate of file_path.
+
+    Files in search_paths that are not yet indexed are extracted first; every
+    file extracted earlier in text mode is already part of the index.
+    """
+    logging.info(f"find_near_duplicates called with file_path: {file_path}, threshold: {threshold}")
+    try:
+        key = os.path.abspath(file_path)
+        pending = [path for path in [file_path] + list(search_paths or [])
+                   if await _indexed_signature(os.path.abspath(path)) is None]
+        if pending:
+            await extract_files(pending, tika_url)
+            for path in pending:
+                await _indexed_signature(os.path.abspath(path))
+
+        signature = dedup.index.get_signature(key)
+        if signature is None:
+            raise Exception(f"Could not extract text from {file_path}")
+
+        matches = dedup.index.query(signature, threshold, exclude=key)
+        return {
+            "file_path": key,
+            "duplicates": [{"file_path": path, "similarity": similarity} for path, similarity in matches],
+            "indexed_documents": len(dedup.index),
+        }
+    except Exception as e:
+        logging.error(f"Error in find_near_duplicates: {e}")
+        logging.error(traceback.format_exc())
+        return {"error": str(e)}
+
+async def _map_files(file_paths: List[str], concurrency: int, work) -> dict:
+    """Run work(path) for every path with bounded concurrency, keeping errors per file."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(path: str) -> dict:
+        async with semaphore:
+            try:
+                return dict(await work(path), file_path=path)
+            except Exception as e:
+                logging.error(f"Error processing {path}: {e}")
+                return {"file_path": path, "error": str(e)}
+
+    return {"results": await asyncio.gather(*(run(path) for path in file_paths))}
+
+async def detect_types(file_paths: List[str], tika_url: str, window_bytes: int = DEFAULT_DETECT_WINDOW,
+                       concurrency: int = DEFAULT_TRIAGE_CONCURRENCY) -> dict:
+    """Detect the media type of many files from their leading bytes and names."""
+    logging.info(f"detect_types called with {len(file_paths)} files, window_bytes: {window_bytes}")
+
+    async def detect(path: str) -> dict:
+        head = await asyncio.to_thread(read_file_head, path, window_bytes)
+        content_type = await asyncio.to_thread(detect_type, head, tika_url, os.path.basename(path))
+        return {"content_type": content_type}
+
+    return await _map_files(file_paths, concurrency, detect)
+
+async def get_metadata(file_paths: List[str], tika_url: str, fields: Optional[List[str]] = None,
+                       profile: str = "fast", concurrency: int = DEFAULT_TRIAGE_CONCURRENCY) -> dict:
+    """Fetch Tika metadata for many files without extracting their text.
+
+    The "fast" profile is used by default, since OCR and embedded documents
+    contribute text rather than metadata.
+    """
+    logging.info(f"get_metadata called with {len(file_paths)} files, profile: {profile}")
+    headers = profile_headers(profile)
+
+    async def fetch(path: str) -> dict:
+        file_bytes = await asyncio.to_thread(read_file_bytes, path)
+        metadata = await asyncio.to_thread(request_metadata, file_bytes, tika_url, headers)
+        if fields:
+            metadata = {key: value for key, value in metadata.items() if key in fields}
+        return {"metadata": metadata}
+
+    return await _map_files(file_paths, concurrency, fetch)
+
+def read_file_head(file_path: str, size: int) -> bytes:
+    with open(file_path, "rb") as f:
+        return f.read(size)
 
 def read_file_bytes(file_path: str) -> bytes:
     logging.info(f"Reading file: {file_path}")
@@ -0,0 +1,62 @@
+"""
+Page-range selection. PDFs are cut down locally to the requested pages before
+they are sent to Tika, so the work scales with the pages asked for.
+"""
+
+import io
+import logging
+from typing import List, Optional, Tuple
+from pypdf import PdfReader, PdfWriter
+from pypdf.errors import PdfReadError
+
+# Upper bound on the number of pages a single range may expand to.
+MAX_PAGES = 100000
+
+def parse_page_ranges(spec: str) -> List[int]:
+    """Parse a 1-based page specification such as "40-45" or "1,3,7-9"."""
+    pages = set()
+    for part in spec.replace(" ", "").split(","):
+        if not part:
+            continue
+        try:
+            if "-" in part:
+                first, last = (int(value) for value in part.split("-", 1))
+            else:
+                first = last = int(part)
+        except ValueError:
+            raise ValueError(f"Invalid page range: {part!r}")
+        if first < 1 or last < first or last - first >= MAX_PAGES:
+            raise ValueError(f"Invalid page range: {part!r}")
+        pages.update(range(first, last + 1))
+    if not pages:
+        raise ValueError(f"No pages in page specification: {spec!r}")
+    return sorted(pages)
+
+def is_pdf(file_bytes: bytes) -> bool:
+    return file_bytes[:1024].lstrip().startswith(b"%PDF")
+
+def slice_pdf(file_bytes: bytes, pages: List[int]) -> Optional[Tuple[bytes, List[int]]]:
+    """Build a PDF holding only the requested pages.
+
+    Returns the new document and the page numbers it contains, in order, or
+    None when file_bytes is not a PDF that can be sliced locally.
+    """
+    if not is_pdf(file_bytes):
+        return None
+    try:
+        reader = PdfReader(io.BytesIO(file_bytes))
+        if reader.is_encrypted:
+            return None
+        kept = [page for page in pages if page <= len(reader.pages)]
+        if not kept:
+            raise ValueError(f"Document has {len(reader.pages)} pages; none of the requested pages exist")
+        writer = PdfWriter()
+        for page in kept:
+            writer.add_page(reader.pages[page - 1])
+        output = io.BytesIO()
+        writer.write(output)
+    except PdfReadError as e:
+        logging.warning(f"Could not slice PDF locally: {e}")
+        return None
+    logging.info(f"Sliced PDF down to {len(kept)} of {len(reader.pages)} pages")
+    return output.getvalue(), kept
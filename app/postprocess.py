@@ -0,0 +1,120 @@
+"""
+Post-processing of extracted text to cut tokens before it reaches the model.
+
+The pipeline joins words hyphenated across line breaks, drops header and
+footer lines that repeat across pages, and normalises whitespace. Large
+documents are processed in a worker process so the event loop stays free.
+"""
+
+import asyncio
+import logging
+import os
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+# Texts longer than this many characters are processed in the process pool.
+PROCESS_POOL_THRESHOLD = int(os.environ.get("TIKA_POSTPROCESS_POOL_THRESHOLD", 1024 * 1024))
+PROCESS_POOL_WORKERS = int(os.environ.get("TIKA_POSTPROCESS_WORKERS", os.cpu_count() or 1))
+
+# A line is treated as boilerplate when it repeats on at least this many pages.
+BOILERPLATE_MIN_REPEATS = 3
+# Only short lines are considered boilerplate candidates.
+BOILERPLATE_MAX_LENGTH = 120
+# Number of lines at the top and bottom of each page checked for boilerplate.
+BOILERPLATE_EDGE_LINES = 3
+
+_HYPHENATED_RE = re.compile(r"(?<=\w)-[ \t]*\n[ \t]*(?=\w)")
+_DIGITS_RE = re.compile(r"\d+")
+_SPACES_RE = re.compile(r"[^\S\n]+")
+_LINE_EDGE_SPACES_RE = re.compile(r" ?\n ?")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+def dehyphenate(text: str) -> str:
+    """Join words split by a hyphen at the end of a line."""
+    return _HYPHENATED_RE.sub("", text)
+
+def normalize_whitespace(text: str) -> str:
+    """Collapse runs of spaces and tabs and limit blank lines to one."""
+    text = _SPACES_RE.sub(" ", text)
+    text = _LINE_EDGE_SPACES_RE.sub("\n", text)
+    return _BLANK_LINES_RE.sub("\n\n", text).strip()
+
+def _boilerplate_key(line: str) -> str:
+    # Page numbers and dates vary between pages, so compare lines with their
+    # digits masked.
+    return _DIGITS_RE.sub("#", " ".join(line.split()).lower())
+
+def _edge_positions(lines: List[str]) -> List[int]:
+    """Indices of the first and last non-blank lines of a page."""
+    positions = [index for index, line in enumerate(lines) if line.strip()]
+    if len(positions) <= 2 * BOILERPLATE_EDGE_LINES:
+        return positions
+    return positions[:BOILERPLATE_EDGE_LINES] + positions[-BOILERPLATE_EDGE_LINES:]
+
+def remove_boilerplate(text: str, min_repeats: int = BOILERPLATE_MIN_REPEATS) -> str:
+    """Drop short lines that recur at the top or bottom of many pages.
+
+    Pages are delimited by form feeds; text without any is returned as is.
+    Only lines at the edges of a page are removed, so the same line in the
+    body of a page, such as a repeated form label, is kept.
+    """
+    if "\f" not in text:
+        return text
+    pages = [page.split("\n") for page in text.split("\f")]
+    if len(pages) < min_repeats:
+        return text
+
+    edges = [[index for index in _edge_positions(lines) if len(lines[index].strip()) <= BOILERPLATE_MAX_LENGTH]
+             for lines in pages]
+    counts = Counter()
+    for lines, positions in zip(pages, edges):
+        counts.update({_boilerplate_key(lines[index]) for index in positions})
+    boilerplate = {key for key, count in counts.items() if count >= min_repeats and key.strip("# ")}
+    if not boilerplate:
+        return text
+
+    logging.info(f"Removing {len(boilerplate)} boilerplate lines repeated across {len(pages)} pages")
+    kept = []
+    for lines, positions in zip(pages, edges):
+        dropped = {index for index in positions if _boilerplate_key(lines[index]) in boilerplate}
+        kept.append("\n".join(line for index, line in enumerate(lines) if index not in dropped))
+    return "\f".join(kept)
+
+def postprocess_text(text: str, dehyphenate_lines: bool = True, strip_boilerplate: bool = True,
+                     normalize: bool = True) -> str:
+    """Run the post-processing pipeline over extracted text."""
+    if strip_boilerplate:
+        text = remove_boilerplate(text)
+    if dehyphenate_lines:
+        text = dehyphenate(text)
+    if normalize:
+        text = normalize_whitespace(text)
+    return text
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=PROCESS_POOL_WORKERS)
+    return _pool
+
+async def postprocess_text_async(text: str, **options) -> Tuple[str, dict]:
+    """Post-process text off the event loop and report the size reduction.
+
+    Texts above PROCESS_POOL_THRESHOLD run in a process pool so several large
+    documents use several cores; smaller ones run in a thread.
+    """
+    loop = asyncio.get_running_loop()
+    if len(text) > PROCESS_POOL_THRESHOLD:
+        processed = await loop.run_in_executor(_get_pool(), _postprocess_with_options, text, options)
+    else:
+        processed = await asyncio.to_thread(postprocess_text, text, **options)
+    stats = {"input_chars": len(text), "output_chars": len(processed)}
+    logging.info(f"Post-processing reduced text from {stats['input_chars']} to {stats['output_chars']} characters")
+    return processed, stats
+
+def _postprocess_with_options(text: str, options: dict) -> str:
+    return postprocess_text(text, **options)
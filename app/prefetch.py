@@ -0,0 +1,116 @@
+"""
+Speculative prefetching of sibling documents.
+
+After a file is extracted, agents usually ask for the next file in the same
+folder. The prefetcher extracts likely next files in the background, one at a
+time and only while no foreground extraction is running, and leaves the
+results in the result cache.
+"""
+
+import asyncio
+import logging
+import os
+from typing import List, Optional
+from app import model
+from app.cache import result_cache
+
+PREFETCH_ENABLED = os.environ.get("TIKA_PREFETCH", "0").lower() in ("1", "true", "yes")
+DEFAULT_MAX_FILES = int(os.environ.get("TIKA_PREFETCH_MAX_FILES", 5))
+DEFAULT_MAX_BYTES = int(os.environ.get("TIKA_PREFETCH_MAX_BYTES", 50 * 1024 * 1024))
+# The server must have been idle this long before a prefetch starts.
+DEFAULT_IDLE_DELAY = float(os.environ.get("TIKA_PREFETCH_IDLE_DELAY", 0.5))
+IDLE_POLL_INTERVAL = 0.1
+
+def candidate_files(file_path: str) -> List[str]:
+    """Return the siblings of file_path in the order they are likely to be opened.
+
+    Files that sort after file_path by name come first, in name order,
+    followed by the remaining files from most to least recently modified.
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    current = os.path.basename(file_path)
+    siblings = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name == current or entry.name.startswith(".") or not entry.is_file():
+                continue
+            siblings.append((entry.name, entry.stat().st_mtime))
+    following = sorted(name for name, _ in siblings if name > current)
+    preceding = [name for name, _ in sorted(siblings, key=lambda item: item[1], reverse=True)
+                 if name < current]
+    return [os.path.join(directory, name) for name in following + preceding]
+
+class Prefetcher:
+    """Extracts sibling files in the background within strict budgets.
+
+    Only the most recently scheduled prefetch runs; scheduling a new one
+    cancels the previous run, since the agent has moved on.
+    """
+
+    def __init__(self, enabled: bool = PREFETCH_ENABLED, max_files: int = DEFAULT_MAX_FILES,
+                 max_bytes: int = DEFAULT_MAX_BYTES, idle_delay: float = DEFAULT_IDLE_DELAY):
+        self.enabled = enabled
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.idle_delay = idle_delay
+        self.task: Optional[asyncio.Task] = None
+        self.prefetched_files = 0
+        self.prefetched_bytes = 0
+        self.skipped_files = 0
+        self.cancelled_runs = 0
+
+    def schedule(self, file_path: str, tika_url: str, **options):
+        """Start prefetching the siblings of file_path, if enabled."""
+        if not self.enabled:
+            return
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            self.cancelled_runs += 1
+        self.task = asyncio.create_task(self._run(file_path, tika_url, options))
+
+    async def _wait_until_idle(self):
+        while model.idle_seconds() < self.idle_delay:
+            await asyncio.sleep(IDLE_POLL_INTERVAL)
+
+    async def _run(self, file_path: str, tika_url: str, options: dict):
+        try:
+            candidates = await asyncio.to_thread(candidate_files, file_path)
+            files = 0
+            budget = self.max_bytes
+            for candidate in candidates:
+                if files >= self.max_files or budget <= 0:
+                    break
+                try:
+                    size = os.path.getsize(candidate)
+                except OSError:
+                    continue
+                if size > budget:
+                    self.skipped_files += 1
+                    continue
+                await self._wait_until_idle()
+                logging.info(f"Prefetching {candidate}")
+                result = await model.extract_file_content(candidate, tika_url, background=True, **options)
+                files += 1
+                budget -= size
+                if "error" in result:
+                    continue
+                self.prefetched_files += 1
+                self.prefetched_bytes += size
+        except asyncio.CancelledError:
+            logging.info(f"Prefetch of siblings of {file_path} cancelled")
+            raise
+        except Exception as e:
+            logging.error(f"Error prefetching siblings of {file_path}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "prefetched_files": self.prefetched_files,
+            "prefetched_bytes": self.prefetched_bytes,
+            "skipped_files": self.skipped_files,
+            "cancelled_runs": self.cancelled_runs,
+            "hits": result_cache.prefetch_hits,
+            "hit_rate": result_cache.prefetch_hits / self.prefetched_files if self.prefetched_files else 0.0,
+        }
+
+prefetcher = Prefetcher()
@@ -0,0 +1,42 @@
+"""
+Named extraction profiles and the Tika request headers they map to.
+
+Tika server reads per-request parser configuration from X-Tika-* headers,
+which lets a single server run a quick text-only pass or a thorough pass with
+OCR and embedded documents depending on the call.
+"""
+
+import os
+
+PROFILES = {
+    # Tika's own defaults, as configured on the server.
+    "default": {},
+    # Text layer only: no OCR, no inline images, no embedded documents.
+    "fast": {
+        "X-Tika-OCRskipOcr": "true",
+        "X-Tika-PDFOcrStrategy": "no_ocr",
+        "X-Tika-PDFextractInlineImages": "false",
+        "X-Tika-Skip-Embedded": "true",
+    },
+    # OCR only pages without a text layer; embedded documents are parsed but
+    # images inside PDFs are not.
+    "balanced": {
+        "X-Tika-PDFOcrStrategy": "auto",
+        "X-Tika-PDFextractInlineImages": "false",
+    },
+    # OCR everything, including inline images, and pull in annotations.
+    "thorough": {
+        "X-Tika-PDFOcrStrategy": "ocr_and_text",
+        "X-Tika-PDFextractInlineImages": "true",
+        "X-Tika-PDFextractAnnotationText": "true",
+        "X-Tika-OCRskipOcr": "false",
+    },
+}
+
+DEFAULT_PROFILE = os.environ.get("TIKA_PROFILE", "default")
+
+def profile_headers(profile: str) -> dict:
+    """Return the Tika request headers for a named profile."""
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown extraction profile: {profile} (expected one of {sorted(PROFILES)})")
+    return dict(PROFILES[profile])
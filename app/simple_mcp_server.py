@@ -7,7 +7,9 @@ import sys
 import json
 import logging
 import pathlib
-from app.tika_client import extract_metadata
+from app.tika_client import extract_metadata, request_metadata
+from app.postprocess import postprocess_text
+from app.xhtml_blocks import BLOCK_TYPES, extract_blocks
 
 # Set up logging to a file
 logging.basicConfig(
@@ -83,6 +85,20 @@ def main():
                                             "tika_url": {
                                                 "type": "string",
                                                 "description": "URL of the running Tika server."
+                                            },
+                                            "mode": {
+                                                "type": "string",
+                                                "enum": ["text", "structured"],
+                                                "description": "\"text\" for plain text, or \"structured\" for typed blocks with offsets."
+                                            },
+                                            "block_types": {
+                                                "type": "array",
+                                                "items": {"type": "string", "enum": list(BLOCK_TYPES)},
+                                                "description": "In structured mode, only return blocks of these types."
+                                            },
+                                            "postprocess": {
+                                                "type": "boolean",
+                                                "description": "In text mode, join hyphenated line breaks, drop repeated page headers and footers and normalise whitespace."
                                             }
                                         },
                                         "required": ["file_path", "tika_url"]
@@ -106,7 +122,10 @@ def main():
                     if tool_name == "extract_file":
                         file_path = arguments.get("file_path")
                         tika_url = arguments.get("tika_url")
-                        logging.info(f"Extracting file: {file_path} using Tika at {tika_url}")
+                        mode = arguments.get("mode", "text")
+                        block_types = arguments.get("block_types")
+                        postprocess = arguments.get("postprocess", False)
+                        logging.info(f"Extracting file: {file_path} using Tika at {tika_url} (mode: {mode})")
                         
                         try:
                             # Read the file
@@ -115,7 +134,21 @@ def main():
                                 file_bytes = f.read()
                             
                             # Extract metadata using Tika
-                            metadata, content = extract_metadata(file_bytes, tika_url)
+                            if mode == "structured":
+                                metadata = request_metadata(file_bytes, tika_url)
+                                content_blocks = extract_blocks(file_bytes, tika_url, block_types)
+                            elif mode == "text":
+                                metadata, content = extract_metadata(file_bytes, tika_url)
+                                if postprocess:
+                                    content = postprocess_text(content)
+                                content_blocks = [
+                                    {
+                                        "type": "text",
+                                        "text": content
+                                    }
+                                ]
+                            else:
+                                raise ValueError(f"Unknown extraction mode: {mode}")
                             
                             # Format the response
                             response = {
@@ -123,12 +156,7 @@ def main():
                                 "id": message["id"],
                                 "result": {
                                     "metadata": metadata,
-                                    "content": [
-                                        {
-                                            "type": "text",
-                                            "text": content
-                                        }
-                                    ]
+                                    "content": content_blocks
                                 }
                             }
                         except Exception as e:
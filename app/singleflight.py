@@ -0,0 +1,54 @@
+"""
+In-flight request coalescing.
+
+Concurrent callers asking for the same key share a single execution of the
+work: the first caller starts it and everyone awaits the same task, so they
+all receive its result or its exception.
+"""
+
+import asyncio
+import copy
+import logging
+from typing import Awaitable, Callable, Dict
+
+class SingleFlight:
+    """Deduplicates concurrent async calls by key."""
+
+    def __init__(self):
+        self.calls: Dict[str, asyncio.Task] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, work: Callable[[], Awaitable[dict]]) -> dict:
+        """Run work() for key, or join the call already in flight for it.
+
+        Every caller, the one that started the call included, gets its own
+        deep copy of the result, so that none of them sees another's changes.
+        Cancelling one caller does not cancel the shared call for the others.
+        """
+        task = self.calls.get(key)
+        if task is not None:
+            self.coalesced += 1
+            logging.info(f"Coalescing request for {key[:16]} with the call in flight")
+        else:
+            task = asyncio.ensure_future(work())
+            self.calls[key] = task
+            self.executed += 1
+            task.add_done_callback(lambda finished: self._finish(key, finished))
+        return copy.deepcopy(await asyncio.shield(task))
+
+    def _finish(self, key: str, task: asyncio.Task):
+        if self.calls.get(key) is task:
+            del self.calls[key]
+        # Mark the exception as retrieved even if every caller was cancelled.
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self.calls),
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+        }
+
+extractions = SingleFlight()
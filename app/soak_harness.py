@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Soak test for the MCP servers.
+Keeps N concurrent MCP sessions calling extract_file against a local stand-in
+Tika (or a real one) for a long period, samples RSS, open file descriptors,
+thread counts and latency percentiles over time, and flags leaks or drift in
+a machine-readable JSON report. Exits with status 1 when anything is flagged.
+
+Example:
+    python -m app.soak_harness --sessions 4 --duration 7200 --report soak.json
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import queue
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import List, Optional
+from app.stub_tika import start_stub
+
+REPO_ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+SERVER_MODULES = {
+    "simple": "app.simple_mcp_server",
+    "fastmcp": "app.main",
+}
+
+RESPONSE_TIMEOUT = 120.0
+
+def _percentile(ordered: List[float], fraction: float) -> Optional[float]:
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+def _slope(xs: List[float], ys: List[float]) -> float:
+    """Least-squares slope of ys over xs."""
+    n = len(xs)
+    if n < 2:
+        return 0.0
+    mean_x = sum(xs) / n
+    mean_y = sum(ys) / n
+    denominator = sum((x - mean_x) ** 2 for x in xs)
+    if not denominator:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / denominator
+
+def process_stats(pid: int) -> dict:
+    """Read RSS, thread count and open file descriptors from /proc (Linux only)."""
+    stats = {"rss_bytes": None, "threads": None, "fds": None}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    stats["rss_bytes"] = int(line.split()[1]) * 1024
+                elif line.startswith("Threads:"):
+                    stats["threads"] = int(line.split()[1])
+        stats["fds"] = len(os.listdir(f"/proc/{pid}/fd"))
+    except (OSError, ValueError):
+        pass
+    return stats
+
+class Session:
+    """One MCP server process driven over stdio by a worker thread."""
+
+    def __init__(self, index: int, server: str, tika_url: str, files: List[str], workdir: str,
+                 env: Optional[dict] = None):
+        self.index = index
+        self.server = server
+        self.tika_url = tika_url
+        self.files = files
+        self.next_id = 0
+        self.lines: "queue.Queue[Optional[str]]" = queue.Queue()
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+        env = dict(os.environ, PYTHONPATH=str(REPO_ROOT), **(env or {}))
+        # Run in a scratch directory so the servers' log files stay out of the repo.
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", SERVER_MODULES[server]],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            cwd=workdir,
+            env=env,
+        )
+        threading.Thread(target=self._read_stdout, daemon=True).start()
+
+    def _read_stdout(self):
+        for line in self.proc.stdout:
+            self.lines.put(line)
+        self.lines.put(None)
+
+    def _send(self, message: dict):
+        self.proc.stdin.write(json.dumps(message) + "\n")
+        self.proc.stdin.flush()
+
+    def request(self, method: str, params: dict) -> dict:
+        request_id = self.next_id
+        self.next_id += 1
+        self._send({"jsonrpc": "2.0", "method": method, "params": params, "id": request_id})
+        deadline = time.monotonic() + RESPONSE_TIMEOUT
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"No response to {method} within {RESPONSE_TIMEOUT}s")
+            line = self.lines.get(timeout=remaining)
+            if line is None:
+                raise RuntimeError("Server closed its stdout")
+            # The servers print diagnostics to stdout as well; skip anything
+            # that is not the JSON-RPC response we are waiting for.
+            try:
+                message = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(message, dict) and message.get("id") == request_id:
+                return message
+
+    def initialize(self):
+        if self.server == "fastmcp":
+            self.request("initialize", {
+                "protocolVersion": "2024-11-05",
+                "capabilities": {},
+                "clientInfo": {"name": "soak-test", "version": "0.1.0"},
+            })
+            self._send({"jsonrpc": "2.0", "method": "notifications/initialized", "params": {}})
+        else:
+            self.request("initialize", {"protocolVersion": "0.1.0", "capabilities": {}})
+            self._send({"jsonrpc": "2.0", "method": "initialized", "params": {}})
+
+    def run(self, stop: threading.Event):
+        try:
+            self.initialize()
+        except Exception as e:
+            print(f"❌ Session {self.index} failed to initialize: {e}", file=sys.stderr)
+            with self.lock:
+                self.errors += 1
+            return
+        call = 0
+        while not stop.is_set():
+            file_path = self.files[(call + self.index) % len(self.files)]
+            call += 1
+            started = time.monotonic()
+            try:
+                response = self.request("tools/call", {
+                    "name": "extract_file",
+                    "arguments": {"file_path": file_path, "tika_url": self.tika_url},
+                })
+                failed = "error" in response or response.get("result", {}).get("isError")
+            except Exception as e:
+                print(f"⚠️ Session {self.index} request failed: {e}", file=sys.stderr)
+                failed = True
+                if self.proc.poll() is not None:
+                    with self.lock:
+                        self.requests += 1
+                        self.errors += 1
+                    return
+            elapsed = time.monotonic() - started
+            with self.lock:
+                self.requests += 1
+                self.latencies.append(elapsed)
+                if failed:
+                    self.errors += 1
+
+    def drain(self) -> tuple:
+        with self.lock:
+            latencies, self.latencies = self.latencies, []
+            requests, errors = self.requests, self.errors
+        return latencies, requests, errors
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        self.proc.terminate()
+        try:
+            self.proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+
+def analyse(samples: List[dict], warmup: float, rss_tolerance_mb: float, rss_growth_pct: float,
+            fd_tolerance: int, thread_tolerance: int, latency_drift_ratio: float) -> dict:
+    """Fit trends to the post-warm-up samples and flag leaks or drift."""
+    if not samples:
+        return {"flags": ["no samples collected"], "trends": {}}
+    cutoff = samples[-1]["elapsed"] * warmup
+    steady = [sample for sample in samples if sample["elapsed"] >= cutoff] or samples
+    hours = [sample["elapsed"] / 3600 for sample in steady]
+    span_hours = max(hours[-1] - hours[0], 1e-9)
+    flags = []
+    trends = {}
+
+    for metric in ("rss_bytes", "fds", "threads"):
+        points = [(hour, sample[metric]) for hour, sample in zip(hours, steady) if sample[metric] is not None]
+        if len(points) < 2:
+            continue
+        xs, ys = zip(*points)
+        slope = _slope(list(xs), list(ys))
+        trends[metric] = {"start": ys[0], "end": ys[-1], "slope_per_hour": slope, "fitted_growth": slope * span_hours}
+
+    rss = trends.get("rss_bytes")
+    if rss:
+        growth_mb = rss["fitted_growth"] / (1024 * 1024)
+        allowed_mb = max(rss_tolerance_mb, rss["start"] / (1024 * 1024) * rss_growth_pct / 100)
+        if growth_mb > allowed_mb:
+            flags.append(f"RSS grew {growth_mb:.1f} MB over the steady-state window (allowed {allowed_mb:.1f} MB)")
+    fds = trends.get("fds")
+    if fds and fds["fitted_growth"] > fd_tolerance:
+        flags.append(f"Open file descriptors grew by {fds['fitted_growth']:.1f} (allowed {fd_tolerance})")
+    threads = trends.get("threads")
+    if threads and threads["fitted_growth"] > thread_tolerance:
+        flags.append(f"Thread count grew by {threads['fitted_growth']:.1f} (allowed {thread_tolerance})")
+
+    windows = [sample for sample in steady if sample["latency"]["p95"] is not None]
+    if len(windows) >= 4:
+        quarter = len(windows) // 4
+        early = sorted(sample["latency"]["p95"] for sample in windows[:quarter])
+        late = sorted(sample["latency"]["p95"] for sample in windows[-quarter:])
+        early_p95 = _percentile(early, 0.5)
+        late_p95 = _percentile(late, 0.5)
+        trends["latency_p95"] = {"early": early_p95, "late": late_p95}
+        if early_p95 and late_p95 / early_p95 > latency_drift_ratio:
+            flags.append(f"p95 latency drifted from {early_p95 * 1000:.1f} ms to {late_p95 * 1000:.1f} ms")
+
+    return {"flags": flags, "trends": trends}
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak test the MCP server for memory and latency drift")
+    parser.add_argument("--server", choices=sorted(SERVER_MODULES), default="simple", help="Server implementation to run")
+    parser.add_argument("--sessions", type=int, default=4, help="Concurrent MCP sessions (server processes)")
+    parser.add_argument("--duration", type=float, default=3600, help="Test duration in seconds")
+    parser.add_argument("--sample-interval", type=float, default=10, help="Seconds between samples")
+    parser.add_argument("--files", nargs="+", default=[str(REPO_ROOT / "examples" / "test-ocr.pdf")], help="Files to extract in rotation")
+    parser.add_argument("--tika-url", help="Use this Tika server instead of the local stand-in")
+    parser.add_argument("--keep-cache", action="store_true", help="Leave the result cache on; by default it is disabled so every call reaches Tika")
+    parser.add_argument("--stub-delay", type=float, default=0.0, help="Artificial latency of the stand-in Tika, in seconds")
+    parser.add_argument("--warmup", type=float, default=0.1, help="Fraction of the run ignored when fitting trends")
+    parser.add_argument("--rss-tolerance-mb", type=float, default=20.0, help="RSS growth always tolerated, per session")
+    parser.add_argument("--rss-growth-pct", type=float, default=10.0, help="RSS growth tolerated as a percentage of the starting RSS")
+    parser.add_argument("--fd-tolerance", type=int, default=4, help="Open file descriptor growth tolerated, per session")
+    parser.add_argument("--thread-tolerance", type=int, default=2, help="Thread count growth tolerated, per session")
+    parser.add_argument("--latency-drift-ratio", type=float, default=1.5, help="Late/early p95 latency ratio that counts as drift")
+    parser.add_argument("--report", help="Write the JSON report to this path as well as stdout")
+    args = parser.parse_args()
+
+    files = [str(pathlib.Path(path).resolve()) for path in args.files]
+    stub = None
+    tika_url = args.tika_url
+    if not tika_url:
+        stub = start_stub(0, args.stub_delay)
+        tika_url = f"http://127.0.0.1:{stub.server_port}"
+        print(f"🧪 Started stand-in Tika at {tika_url}", file=sys.stderr)
+
+    workdir = tempfile.mkdtemp(prefix="tika-mcp-soak-")
+    # With the result cache on, only the first call per file would reach Tika,
+    # and the run would measure cache hits instead of the request path.
+    env = {} if args.keep_cache else {"TIKA_CACHE_MAX_ENTRIES": "0"}
+    sessions = [Session(index, args.server, tika_url, files, workdir, env) for index in range(args.sessions)]
+    stop = threading.Event()
+    workers = [threading.Thread(target=session.run, args=(stop,), daemon=True) for session in sessions]
+    for worker in workers:
+        worker.start()
+    print(f"🚀 Running {args.sessions} {args.server} sessions for {args.duration:.0f}s", file=sys.stderr)
+
+    samples = []
+    started = time.monotonic()
+    try:
+        while time.monotonic() - started < args.duration:
+            time.sleep(min(args.sample_interval, max(0.0, args.duration - (time.monotonic() - started))))
+            latencies = []
+            requests = errors = 0
+            per_session = []
+            for session in sessions:
+                session_latencies, session_requests, session_errors = session.drain()
+                latencies.extend(session_latencies)
+                requests += session_requests
+                errors += session_errors
+                per_session.append(process_stats(session.proc.pid))
+            latencies.sort()
+            sample = {"elapsed": time.monotonic() - started, "requests": requests, "errors": errors,
+                      "latency": {"count": len(latencies), "p50": _percentile(latencies, 0.5),
+                                  "p95": _percentile(latencies, 0.95), "p99": _percentile(latencies, 0.99)}}
+            # Per-session means, so tolerances do not depend on the session count.
+            for metric in ("rss_bytes", "fds", "threads"):
+                values = [stats[metric] for stats in per_session if stats[metric] is not None]
+                sample[metric] = sum(values) / len(values) if values else None
+            samples.append(sample)
+            print(f"⏱️ {sample['elapsed']:.0f}s: {requests} requests, {errors} errors, "
+                  f"RSS {((sample['rss_bytes'] or 0) / 1048576):.1f} MB, fds {sample['fds']}, threads {sample['threads']}, "
+                  f"p95 {sample['latency']['p95']}", file=sys.stderr)
+    except KeyboardInterrupt:
+        print("🛑 Interrupted, writing report...", file=sys.stderr)
+    finally:
+        stop.set()
+        for session in sessions:
+            session.close()
+        if stub is not None:
+            stub.shutdown()
+
+    analysis = analyse(samples, args.warmup, args.rss_tolerance_mb, args.rss_growth_pct,
+                       args.fd_tolerance, args.thread_tolerance, args.latency_drift_ratio)
+    if samples and samples[-1]["errors"]:
+        analysis["flags"].append(f"{samples[-1]['errors']} of {samples[-1]['requests']} requests failed")
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key != "report"},
+        "tika_url": tika_url,
+        "samples": samples,
+        "summary": {
+            "requests": samples[-1]["requests"] if samples else 0,
+            "errors": samples[-1]["errors"] if samples else 0,
+            # Requests that reached the stand-in Tika; a few per call unless
+            # --keep-cache is given.
+            "tika_requests": sum(stub.put_requests.values()) if stub is not None else None,
+            "trends": analysis["trends"],
+        },
+        "flags": analysis["flags"],
+        "passed": not analysis["flags"],
+    }
+    output = json.dumps(report, indent=2)
+    if args.report:
+        pathlib.Path(args.report).write_text(output)
+    print(output)
+    return 0 if report["passed"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for an Apache Tika server, for soak and load testing without
+a JVM. It answers the endpoints this project uses with deterministic output
+derived from the uploaded bytes, after an optional artificial delay.
+"""
+
+import argparse
+import datetime
+import html
+import io
+import json
+import threading
+import time
+import zipfile
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def _text_of(body: bytes) -> str:
+    return body.decode("utf-8", errors="replace")
+
+def _metadata(body: bytes) -> dict:
+    return {
+        "Content-Type": "text/plain; charset=UTF-8",
+        "X-TIKA:Parsed-By": ["org.apache.tika.parser.DefaultParser", "StubParser"],
+    }
+
+def _entry_metadata(info: zipfile.ZipInfo) -> dict:
+    # What Tika's zip parser adds to each member from its zip entry.
+    return {
+        "resourceName": info.filename,
+        "X-TIKA:internalPath": info.filename,
+        "Content-Length": str(info.file_size),
+        "dcterms:modified": datetime.datetime(*info.date_time).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "embeddedResourceType": "ATTACHMENT",
+    }
+
+def _xhtml(text: str) -> str:
+    # Shaped like Tika's XML serialization: self-closed <meta> elements in the
+    # head, a newline after each block and, for text with form feeds (standing
+    # in for a paged format), one <div class="page"> per page.
+    pages = []
+    for page in text.split("\f"):
+        paragraphs = "".join(f"<p>{html.escape(line)}</p>\n" for line in page.splitlines() if line.strip())
+        pages.append(f'<div class="page">{paragraphs}</div>\n' if "\f" in text else paragraphs)
+    return ('<?xml version="1.0" encoding="UTF-8"?><html xmlns="http://www.w3.org/1999/xhtml">'
+            '<head><meta name="X-TIKA:Parsed-By" content="StubParser"/>'
+            '<meta name="Content-Type" content="text/plain; charset=UTF-8"/><title></title></head>'
+            f'<body>{"".join(pages)}</body></html>')
+
+class StubTikaHandler(BaseHTTPRequestHandler):
+    delay = 0.0
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/") in ("", "/tika", "/version"):
+            self._reply(200, b"Apache Tika stub", "text/plain")
+        else:
+            self._reply(404, b"Not found", "text/plain")
+
+    def do_PUT(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        with self.server.counter_lock:
+            self.server.put_requests[self.path.split("?")[0].rstrip("/")] += 1
+        if self.delay:
+            time.sleep(self.delay)
+        accept = self.headers.get("Accept", "")
+        path = self.path.split("?")[0].rstrip("/")
+
+        if path == "/meta":
+            self._reply(200, json.dumps(_metadata(body)).encode("utf-8"), "application/json")
+        elif path in ("/detect/stream", "/detect"):
+            self._reply(200, b"text/plain", "text/plain")
+        elif path.startswith("/rmeta"):
+            documents = [dict(_metadata(body), **{"X-TIKA:content": _text_of(body)})]
+            if body.startswith(b"PK\x03\x04"):
+                # Zip members are reported as embedded documents, as Tika does.
+                with zipfile.ZipFile(io.BytesIO(body)) as archive:
+                    for info in archive.infolist():
+                        member = archive.read(info)
+                        documents.append(dict(_metadata(member), **_entry_metadata(info), **{
+                            "X-TIKA:content": _text_of(member),
+                            "X-TIKA:embedded_resource_path": f"/{info.filename}", "X-TIKA:embedded_depth": "1"}))
+            self._reply(200, json.dumps(documents).encode("utf-8"), "application/json")
+        elif path.startswith("/unpack"):
+            # A zip upload stands in for a container: its members are the
+            # embedded documents. Anything else has none.
+            if body.startswith(b"PK\x03\x04"):
+                self._reply(200, body, "application/zip")
+            else:
+                self.send_response(204)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+        elif path == "/tika" and "text/xml" in accept:
+            # Only the XML serialization is well-formed; Tika's text/html
+            # output is not, so only text/xml gets XHTML here.
+            self._reply(200, _xhtml(_text_of(body)).encode("utf-8"), "text/xml; charset=UTF-8")
+        elif path == "/tika":
+            # Like Tika's text/plain output, page breaks are lost: only the
+            # XHTML marks them.
+            self._reply(200, body.replace(b"\f", b"\n\n"), "text/plain; charset=UTF-8")
+        else:
+            self._reply(404, b"Not found", "text/plain")
+
+def start_stub(port: int = 0, delay: float = 0.0) -> ThreadingHTTPServer:
+    """Start the stub in a daemon thread and return the server.
+
+    With port 0 an ephemeral port is chosen; read it from server.server_port.
+    server.put_requests counts the requests received per endpoint.
+    """
+    handler = type("ConfiguredStubTikaHandler", (StubTikaHandler,), {"delay": delay})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.put_requests = Counter()
+    server.counter_lock = threading.Lock()
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the Tika server")
+    parser.add_argument("--port", type=int, default=9998, help="Port to listen on (default: 9998)")
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds to wait before answering each request")
+    args = parser.parse_args()
+
+    server = start_stub(args.port, args.delay)
+    print(f"Stub Tika listening on http://127.0.0.1:{server.server_port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+Row-oriented extraction of spreadsheets and CSV files.
+
+Tika flattens a spreadsheet into one block of text. For tabular inputs the
+rows are instead streamed locally (csv for delimited text, openpyxl in
+read-only mode for XLSX) into a compact columnar result: only the requested
+columns, the first rows or a uniform sample of them, and lightweight
+per-column statistics gathered in the same pass.
+"""
+
+import csv
+import datetime
+import logging
+import os
+import random
+import re
+import zipfile
+from typing import Iterator, List, Optional, Tuple
+
+CSV_EXTENSIONS = {".csv", ".tsv", ".tab", ".psv"}
+XLSX_EXTENSIONS = {".xlsx", ".xlsm", ".xltx", ".xltm"}
+DEFAULT_MAX_ROWS = 1000
+# Distinct values are counted exactly up to this many per column.
+DISTINCT_LIMIT = 1000
+SNIFF_BYTES = 64 * 1024
+# Numbers as a spreadsheet would write them. Leading zeros ("02134") mark
+# codes and identifiers, and int() and float() also accept forms such as
+# "1_000", " 5" or "nan" that are not meant as numbers, so only these convert.
+_INTEGER_RE = re.compile(r"-?(?:0|[1-9][0-9]*)")
+_DECIMAL_RE = re.compile(r"-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?")
+
+def table_format(file_path: str) -> Optional[str]:
+    """Return "csv" or "xlsx" for a supported tabular file, else None."""
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in CSV_EXTENSIONS:
+        return "csv"
+    if extension in XLSX_EXTENSIONS or (zipfile.is_zipfile(file_path) and _is_xlsx(file_path)):
+        return "xlsx"
+    return None
+
+def _is_xlsx(file_path: str) -> bool:
+    with zipfile.ZipFile(file_path) as archive:
+        return "xl/workbook.xml" in archive.namelist()
+
+def _convert_text(value: str):
+    """Parse a CSV cell into None, int, float or str."""
+    if value == "":
+        return None
+    if _INTEGER_RE.fullmatch(value):
+        return int(value)
+    if _DECIMAL_RE.fullmatch(value):
+        number = float(value)
+        # "1e999" overflows to infinity; keep it as written.
+        if abs(number) != float("inf"):
+            return number
+    return value
+
+def _convert_cell(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    if isinstance(value, str) and value == "":
+        return None
+    return value
+
+def _iter_csv(file_path: str) -> Iterator[list]:
+    with open(file_path, newline="", encoding="utf-8-sig", errors="replace") as f:
+        sample = f.read(SNIFF_BYTES)
+        f.seek(0)
+        if os.path.splitext(file_path)[1].lower() in (".tsv", ".tab"):
+            dialect = csv.excel_tab
+        else:
+            try:
+                dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+            except csv.Error:
+                dialect = csv.excel
+        for row in csv.reader(f, dialect):
+            yield [_convert_text(value) for value in row]
+
+def _open_sheet(file_path: str, sheet: Optional[str]):
+    # Imported here so that only callers of extract_table need openpyxl.
+    import openpyxl
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    if sheet is not None and sheet not in workbook.sheetnames:
+        workbook.close()
+        raise Exception(f"Unknown sheet: {sheet} (available: {workbook.sheetnames})")
+    return workbook, workbook[sheet] if sheet is not None else workbook.worksheets[0]
+
+def _iter_sheet(worksheet) -> Iterator[list]:
+    for row in worksheet.iter_rows(values_only=True):
+        yield [_convert_cell(value) for value in row]
+
+class ColumnStats:
+    """Running statistics for one column."""
+
+    def __init__(self):
+        self.count = 0
+        self.nulls = 0
+        self.types = {}
+        self.minimum = None
+        self.maximum = None
+        self.total = 0.0
+        self.numbers = 0
+        self.distinct = set()
+        self.distinct_capped = False
+
+    def add(self, value):
+        if value is None:
+            self.nulls += 1
+            return
+        self.count += 1
+        type_name = "bool" if isinstance(value, bool) else "number" if isinstance(value, (int, float)) else "text"
+        self.types[type_name] = self.types.get(type_name, 0) + 1
+        if type_name == "number":
+            self.numbers += 1
+            self.total += value
+            self.minimum = value if self.minimum is None else min(self.minimum, value)
+            self.maximum = value if self.maximum is None else max(self.maximum, value)
+        if not self.distinct_capped:
+            self.distinct.add(value)
+            if len(self.distinct) > DISTINCT_LIMIT:
+                self.distinct_capped = True
+                self.distinct = set()
+
+    def result(self) -> dict:
+        stats = {"count": self.count, "nulls": self.nulls, "types": self.types}
+        if self.numbers:
+            stats.update(min=self.minimum, max=self.maximum, mean=self.total / self.numbers)
+        if self.distinct_capped:
+            stats["distinct_over"] = DISTINCT_LIMIT
+        else:
+            stats["distinct"] = len(self.distinct)
+        return stats
+
+def _resolve_columns(names: List[str], columns: Optional[List[str]]) -> List[int]:
+    if not columns:
+        return list(range(len(names)))
+    positions = []
+    for column in columns:
+        if column not in names:
+            raise Exception(f"Unknown column: {column} (available: {names})")
+        positions.append(names.index(column))
+    return positions
+
+def _project(row: list, positions: List[int]) -> list:
+    return [row[position] if position < len(row) else None for position in positions]
+
+def _chain(first: list, rows: Iterator[list]) -> Iterator[list]:
+    yield first
+    yield from rows
+
+def read_table(rows: Iterator[list], columns: Optional[List[str]] = None, max_rows: int = DEFAULT_MAX_ROWS,
+               sample: Optional[int] = None, stats: bool = True, header: bool = True, seed: int = 0) -> dict:
+    """Turn a stream of rows into the columnar result of extract_table.
+
+    Without sample, the first max_rows data rows are returned, and reading
+    stops there unless stats are wanted. With sample, that many rows are
+    drawn uniformly from the whole table (reservoir sampling) and returned in
+    their original order along with their 1-based row numbers. Blank rows
+    are skipped and not counted.
+    """
+    first = next(rows, None)
+    if first is None:
+        return {"columns": [], "values": [], "rows_returned": 0, "rows_read": 0, "truncated": False}
+    if header:
+        names = [str(value) if value is not None else f"column_{index + 1}" for index, value in enumerate(first)]
+    else:
+        names = [f"column_{index + 1}" for index in range(len(first))]
+        rows = _chain(first, rows)
+    positions = _resolve_columns(names, columns)
+    selected = [names[position] for position in positions]
+    column_stats = [ColumnStats() for _ in positions] if stats else None
+    rng = random.Random(seed)
+    kept: List[Tuple[int, list]] = []
+    read = 0
+    truncated = False
+
+    for row in rows:
+        if not any(value is not None for value in row):
+            # Blank rows carry nothing; spreadsheets often end in many of them.
+            continue
+        if sample is None and not stats and read >= max_rows:
+            truncated = True
+            break
+        read += 1
+        projected = _project(row, positions)
+        if column_stats is not None:
+            for column, value in zip(column_stats, projected):
+                column.add(value)
+        if sample is not None:
+            if len(kept) < sample:
+                kept.append((read, projected))
+            else:
+                slot = rng.randrange(read)
+                if slot < sample:
+                    kept[slot] = (read, projected)
+        elif len(kept) < max_rows:
+            kept.append((read, projected))
+        else:
+            truncated = True
+
+    kept.sort(key=lambda item: item[0])
+    result = {
+        "columns": selected,
+        # One list per column keeps repeated keys out of the result.
+        "values": [[row[index] for _, row in kept] for index in range(len(selected))],
+        "rows_returned": len(kept),
+        "rows_read": read,
+        "truncated": truncated,
+    }
+    if sample is not None:
+        result["row_numbers"] = [number for number, _ in kept]
+    if column_stats is not None:
+        result["stats"] = {name: column.result() for name, column in zip(selected, column_stats)}
+    return result
+
+def extract_table(file_path: str, columns: Optional[List[str]] = None, sheet: Optional[str] = None,
+                  max_rows: int = DEFAULT_MAX_ROWS, sample: Optional[int] = None, stats: bool = True,
+                  header: bool = True, seed: int = 0) -> dict:
+    """Stream rows from a CSV or XLSX file into a columnar result (see read_table)."""
+    logging.info(f"extract_table called with file_path: {file_path}, columns: {columns}, sheet: {sheet}")
+    table = table_format(file_path)
+    if table is None:
+        raise Exception(f"Not a CSV or XLSX file: {file_path}")
+    if table == "csv":
+        result = read_table(_iter_csv(file_path), columns, max_rows, sample, stats, header, seed)
+        return dict(result, format="csv")
+    workbook, worksheet = _open_sheet(file_path, sheet)
+    try:
+        result = read_table(_iter_sheet(worksheet), columns, max_rows, sample, stats, header, seed)
+        return dict(result, format="xlsx", sheet=worksheet.title, sheets=workbook.sheetnames)
+    finally:
+        workbook.close()
@@ -1,37 +1,173 @@
+import codecs
+import threading
 import requests
 import logging
 import traceback
-from typing import Tuple
+from typing import Iterator, Optional, Tuple
+from app.concurrency import limited
 
-def extract_metadata(file_bytes: bytes, tika_url: str) -> Tuple[dict, str]:
-    logging.info(f"extract_metadata called with tika_url: {tika_url}")
-    
-    try:
-        # Request metadata
-        logging.info("Requesting metadata from Tika...")
-        headers = {"Accept": "application/json"}
-        meta_response = requests.put(f"{tika_url}/meta", data=file_bytes, headers=headers)
+# Size of the chunks read from Tika's response body.
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_local = threading.local()
+
+class TikaRequestError(Exception):
+    """Tika answered with a non-200 status."""
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+def is_overload(error: Exception) -> bool:
+    """Whether a failed request means Tika is overloaded rather than the input bad."""
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    return isinstance(error, TikaRequestError) and (error.status_code == 429 or error.status_code >= 500)
+
+def get_session() -> requests.Session:
+    """Return this thread's HTTP session, so connections to Tika are reused."""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        _local.session = session
+    return session
+
+def iter_text(response: requests.Response, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+    """Yield the body of a streamed Tika response as decoded UTF-8 chunks.
+
+    Tika always answers text requests in UTF-8, so the body is decoded
+    incrementally instead of going through requests' charset detection.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    for raw in response.iter_content(chunk_size=chunk_size):
+        if raw:
+            text = decoder.decode(raw)
+            if text:
+                yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+def open_stream(file_bytes: bytes, tika_url: str, accept: str = "text/plain",
+                endpoint: str = "tika", headers: Optional[dict] = None) -> requests.Response:
+    """PUT a document to Tika and return the streamed response.
+
+    The status code is checked before returning; use the response as a
+    context manager so the connection is released. Extra headers, such as
+    those of an extraction profile, are sent along with the Accept header.
+    Callers hold a concurrency slot (see app.concurrency) while the response
+    is consumed.
+    """
+    logging.info(f"Requesting {accept} content from Tika /{endpoint}...")
+    request_headers = dict(headers or {}, Accept=accept)
+    response = get_session().put(f"{tika_url}/{endpoint}", data=file_bytes, headers=request_headers, stream=True)
+    logging.info(f"Text response status: {response.status_code}")
+
+    if response.status_code != 200:
+        logging.error(f"Error response from Tika {endpoint} endpoint: {response.text}")
+        response.close()
+        raise TikaRequestError(f"Tika {endpoint} request failed with status {response.status_code}: {response.text}",
+                               response.status_code)
+
+    return response
+
+def request_text(file_bytes: bytes, tika_url: str, accept: str = "text/plain",
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, headers: Optional[dict] = None) -> str:
+    """PUT a document to Tika's /tika endpoint and return the decoded reply.
+
+    The response is decoded chunk by chunk and joined once, so the raw body
+    is never held alongside the text. Callers that want the text before it is
+    complete iterate over open_stream with iter_text instead.
+    """
+    with limited(tika_url, is_overload):
+        with open_stream(file_bytes, tika_url, accept, headers=headers) as text_response:
+            return "".join(iter_text(text_response, chunk_size))
+
+def request_metadata(file_bytes: bytes, tika_url: str, headers: Optional[dict] = None) -> dict:
+    """PUT a document to Tika's /meta endpoint and return the parsed JSON."""
+    logging.info("Requesting metadata from Tika...")
+    request_headers = dict(headers or {}, Accept="application/json")
+    with limited(tika_url, is_overload, "meta"):
+        meta_response = get_session().put(f"{tika_url}/meta", data=file_bytes, headers=request_headers)
         logging.info(f"Metadata response status: {meta_response.status_code}")
-        
+
         if meta_response.status_code != 200:
             logging.error(f"Error response from Tika metadata endpoint: {meta_response.text}")
-            raise Exception(f"Tika metadata request failed with status {meta_response.status_code}: {meta_response.text}")
-        
-        meta = meta_response.json()
-        logging.info("Successfully parsed metadata JSON")
-        
-        # Request text content
-        logging.info("Requesting text content from Tika...")
-        text_response = requests.put(f"{tika_url}/tika", data=file_bytes, headers={"Accept": "text/plain"})
-        logging.info(f"Text response status: {text_response.status_code}")
-        
-        if text_response.status_code != 200:
-            logging.error(f"Error response from Tika text endpoint: {text_response.text}")
-            raise Exception(f"Tika text request failed with status {text_response.status_code}: {text_response.text}")
-        
-        text = text_response.text
+            raise TikaRequestError(f"Tika metadata request failed with status {meta_response.status_code}: {meta_response.text}",
+                                   meta_response.status_code)
+
+    meta = meta_response.json()
+    logging.info("Successfully parsed metadata JSON")
+    return meta
+
+def detect_type(file_bytes: bytes, tika_url: str, filename: Optional[str] = None) -> str:
+    """Ask Tika's /detect/stream endpoint for the media type of a document.
+
+    file_bytes may be just the leading bytes of the file; the filename, when
+    given, is passed as a hint so that Tika can refine container formats.
+    """
+    headers = {"Accept": "text/plain"}
+    if filename:
+        # Header values must be latin-1; a lossy ASCII name still carries the extension.
+        safe_name = filename.encode("ascii", "replace").decode("ascii").replace('"', "_")
+        headers["Content-Disposition"] = f'attachment; filename="{safe_name}"'
+    with limited(tika_url, is_overload, "detect"):
+        response = get_session().put(f"{tika_url}/detect/stream", data=file_bytes, headers=headers)
+
+        if response.status_code != 200:
+            logging.error(f"Error response from Tika detect endpoint: {response.text}")
+            raise TikaRequestError(f"Tika detect request failed with status {response.status_code}: {response.text}",
+                                   response.status_code)
+
+    return response.text.strip()
+
+def request_recursive_metadata(file_bytes: bytes, tika_url: str, headers: Optional[dict] = None) -> list:
+    """PUT a document to Tika's /rmeta/text endpoint.
+
+    Returns one metadata dict per document, the container first, each with
+    its plain text under "X-TIKA:content".
+    """
+    request_headers = dict(headers or {}, Accept="application/json")
+    with limited(tika_url, is_overload, "rmeta"):
+        response = get_session().put(f"{tika_url}/rmeta/text", data=file_bytes, headers=request_headers)
+        if response.status_code != 200:
+            logging.error(f"Error response from Tika rmeta endpoint: {response.text}")
+            raise TikaRequestError(f"Tika rmeta request failed with status {response.status_code}: {response.text}",
+                                   response.status_code)
+        return response.json()
+
+def request_unpack(file_bytes: bytes, tika_url: str, headers: Optional[dict] = None,
+                   max_bytes: Optional[int] = None) -> bytes:
+    """PUT a document to Tika's /unpack endpoint and return the zip of its
+    direct embedded documents, or b"" when it has none.
+
+    The response is read in chunks and abandoned once it grows past max_bytes.
+    """
+    request_headers = dict(headers or {}, Accept="application/zip")
+    with limited(tika_url, is_overload, "unpack"):
+        with get_session().put(f"{tika_url}/unpack", data=file_bytes, headers=request_headers, stream=True) as response:
+            if response.status_code == 204:
+                return b""
+            if response.status_code != 200:
+                logging.error(f"Error response from Tika unpack endpoint: {response.text}")
+                raise TikaRequestError(f"Tika unpack request failed with status {response.status_code}: {response.text}",
+                                       response.status_code)
+            body = bytearray()
+            for chunk in response.iter_content(chunk_size=DEFAULT_CHUNK_SIZE):
+                body += chunk
+                if max_bytes is not None and len(body) > max_bytes:
+                    raise Exception(f"Tika unpack response exceeds {max_bytes} bytes")
+            return bytes(body)
+
+def extract_metadata(file_bytes: bytes, tika_url: str, headers: Optional[dict] = None) -> Tuple[dict, str]:
+    logging.info(f"extract_metadata called with tika_url: {tika_url}")
+
+    try:
+        meta = request_metadata(file_bytes, tika_url, headers)
+
+        text = request_text(file_bytes, tika_url, headers=headers)
         logging.info(f"Successfully retrieved text content (length: {len(text)})")
-        
+
         return meta, text
     except Exception as e:
         logging.error(f"Error in extract_metadata: {e}")
@@ -0,0 +1,278 @@
+"""
+Streaming conversion of Tika's XHTML output into typed content blocks.
+
+Tika renders documents as XHTML with one <div class="page"> per page (one
+<div class="slide-content"> per slide for presentations), <h1>-<h6> headings, <p> paragraphs and <table> elements. It is requested with
+Tika's XML serialization (Accept: text/xml): the HTML one leaves <meta> and
+<br> unclosed, which an XML parser rejects. The parser below is fed the
+response incrementally and yields blocks as soon as they close, so memory
+stays proportional to the largest single block, not the document.
+"""
+
+import logging
+import xml.sax
+from typing import Iterable, Iterator, List, Optional
+from app.concurrency import limited
+from app.tika_client import DEFAULT_CHUNK_SIZE, is_overload, open_stream
+
+BLOCK_TYPES = ("page", "heading", "paragraph", "table")
+
+HEADING_TAGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+PARAGRAPH_TAGS = {"p", "li", "pre", "blockquote"}
+CELL_TAGS = {"td", "th"}
+# Elements that end a run of text found outside any heading, paragraph or
+# table, such as OCR output in <div class="ocr">.
+BOUNDARY_TAGS = {"div", "ul", "ol", "dl", "dt", "dd", "table"} | set(HEADING_TAGS) | PARAGRAPH_TAGS
+# Classes of the <div> elements that Tika emits per page or slide. Word
+# processing and plain text formats have none.
+PAGE_CLASSES = {"page", "slide-content"}
+
+def _local_name(name: str) -> str:
+    return name.rsplit(":", 1)[-1].lower()
+
+def _is_page(attrs) -> bool:
+    return bool(PAGE_CLASSES.intersection((attrs.get("class") or "").split()))
+
+class BlockHandler(xml.sax.handler.ContentHandler):
+    """SAX handler that turns XHTML events into content blocks.
+
+    Offsets are character positions in the flattened text of the document,
+    where consecutive text blocks are separated by a single newline.
+    Completed blocks are queued in `blocks` for the caller to drain.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.blocks: List[dict] = []
+        self.offset = 0
+        self.page = 0
+        self.page_start: Optional[int] = None
+        self.in_body = False
+        self.divs: List[bool] = []
+        self.current: Optional[dict] = None
+        self.text_parts: List[str] = []
+        self.table_depth = 0
+        self.rows: List[List[str]] = []
+        self.row: Optional[List[str]] = None
+        self.cell_parts: Optional[List[str]] = None
+        self.orphan_parts: List[str] = []
+
+    def _emit_text_block(self, block: dict, text: str, normalize: bool = True):
+        if normalize:
+            text = " ".join(text.split())
+        if not text:
+            return
+        block["text"] = text
+        block["start"] = self.offset
+        block["end"] = self.offset + len(text)
+        if self.page:
+            block["page"] = self.page
+        self.offset = block["end"] + 1
+        self.blocks.append(block)
+
+    def _flush_orphan(self):
+        # Text outside the tracked elements becomes a paragraph of its own.
+        if self.orphan_parts:
+            text = "".join(self.orphan_parts)
+            self.orphan_parts = []
+            self._emit_text_block({"type": "paragraph"}, text)
+
+    def startElement(self, name, attrs):
+        tag = _local_name(name)
+        if tag == "body":
+            self.in_body = True
+            return
+        if not self.in_body:
+            return
+        if tag == "br":
+            # A line break separates words just as whitespace does.
+            self.characters("\n")
+            return
+        if tag in BOUNDARY_TAGS and not self.table_depth and self.current is None:
+            self._flush_orphan()
+
+        if tag == "table":
+            self.table_depth += 1
+            if self.table_depth == 1:
+                self.rows = []
+            return
+        if self.table_depth:
+            if tag == "tr" and self.table_depth == 1:
+                self.row = []
+            elif tag in CELL_TAGS and self.table_depth == 1:
+                self.cell_parts = []
+            return
+
+        if tag == "div":
+            is_page = _is_page(attrs)
+            self.divs.append(is_page)
+            if is_page:
+                self.page += 1
+                self.page_start = self.offset
+        elif tag in HEADING_TAGS and self.current is None:
+            self.current = {"type": "heading", "level": HEADING_TAGS[tag]}
+            self.text_parts = []
+        elif tag in PARAGRAPH_TAGS and self.current is None:
+            self.current = {"type": "paragraph"}
+            self.text_parts = []
+
+    def endElement(self, name):
+        tag = _local_name(name)
+        if tag == "body":
+            self._flush_orphan()
+            self.in_body = False
+            return
+        if not self.in_body:
+            return
+        if tag in BOUNDARY_TAGS and not self.table_depth and self.current is None:
+            self._flush_orphan()
+
+        if tag == "table":
+            self.table_depth -= 1
+            if self.table_depth == 0:
+                self._end_table()
+            return
+        if self.table_depth:
+            if tag in CELL_TAGS and self.table_depth == 1 and self.cell_parts is not None:
+                if self.row is None:
+                    self.row = []
+                self.row.append(" ".join("".join(self.cell_parts).split()))
+                self.cell_parts = None
+            elif tag == "tr" and self.table_depth == 1 and self.row is not None:
+                self.rows.append(self.row)
+                self.row = None
+            return
+
+        if tag == "div":
+            if self.divs and self.divs.pop() and self.page_start is not None:
+                self._end_page()
+        elif self.current is not None and (tag in HEADING_TAGS or tag in PARAGRAPH_TAGS):
+            expected = "heading" if tag in HEADING_TAGS else "paragraph"
+            if self.current["type"] == expected:
+                self._emit_text_block(self.current, "".join(self.text_parts))
+                self.current = None
+                self.text_parts = []
+
+    def characters(self, content):
+        if not self.in_body:
+            return
+        if self.table_depth:
+            if self.cell_parts is not None:
+                self.cell_parts.append(content)
+        elif self.current is not None:
+            self.text_parts.append(content)
+        else:
+            self.orphan_parts.append(content)
+
+    def _end_table(self):
+        rows = [row for row in self.rows if any(row)]
+        self.rows = []
+        if not rows:
+            return
+        text = "\n".join("\t".join(row) for row in rows)
+        self._emit_text_block({"type": "table", "rows": rows}, text, normalize=False)
+
+    def _end_page(self):
+        start = self.page_start
+        self.page_start = None
+        self.blocks.append({
+            "type": "page",
+            "page": self.page,
+            "start": start,
+            "end": max(start, self.offset - 1),
+        })
+
+class PageTextHandler(xml.sax.handler.ContentHandler):
+    """SAX handler that keeps the plain text of the body, as Tika's text/plain
+    output has it, with a form feed between pages or slides."""
+
+    def __init__(self):
+        super().__init__()
+        self.parts: List[str] = []
+        self.in_body = False
+        self.pages = 0
+
+    def startElement(self, name, attrs):
+        tag = _local_name(name)
+        if tag == "body":
+            self.in_body = True
+        elif self.in_body and tag == "br":
+            self.parts.append("\n")
+        elif self.in_body and tag == "div" and _is_page(attrs):
+            if self.pages:
+                self.parts.append("\f")
+            self.pages += 1
+
+    def endElement(self, name):
+        if _local_name(name) == "body":
+            self.in_body = False
+
+    def characters(self, content):
+        if self.in_body:
+            self.parts.append(content)
+
+    ignorableWhitespace = characters
+
+def parse_paged_text(chunks: Iterable[bytes]) -> str:
+    """Incrementally parse XHTML byte chunks into form-feed separated page text."""
+    handler = PageTextHandler()
+    parser = xml.sax.make_parser()
+    parser.setFeature(xml.sax.handler.feature_namespaces, False)
+    parser.setFeature(xml.sax.handler.feature_external_ges, False)
+    parser.setContentHandler(handler)
+    for chunk in chunks:
+        if chunk:
+            parser.feed(chunk)
+    parser.close()
+    return "".join(handler.parts)
+
+def parse_blocks(chunks: Iterable[bytes], block_types: Optional[Iterable[str]] = None) -> Iterator[dict]:
+    """Incrementally parse XHTML byte chunks, yielding blocks as they complete.
+
+    Args:
+        chunks: Raw XHTML bytes, e.g. from a streamed Tika response.
+        block_types: Optional subset of BLOCK_TYPES to yield.
+    """
+    wanted = set(block_types) if block_types else set(BLOCK_TYPES)
+    unknown = wanted - set(BLOCK_TYPES)
+    if unknown:
+        raise ValueError(f"Unknown block types: {sorted(unknown)}")
+
+    handler = BlockHandler()
+    parser = xml.sax.make_parser()
+    parser.setFeature(xml.sax.handler.feature_namespaces, False)
+    parser.setFeature(xml.sax.handler.feature_external_ges, False)
+    parser.setContentHandler(handler)
+
+    def drain():
+        pending = handler.blocks
+        handler.blocks = []
+        for block in pending:
+            if block["type"] in wanted:
+                yield block
+
+    for chunk in chunks:
+        if chunk:
+            parser.feed(chunk)
+            yield from drain()
+    parser.close()
+    yield from drain()
+
+def extract_blocks(file_bytes: bytes, tika_url: str, block_types: Optional[Iterable[str]] = None,
+                   chunk_size: int = DEFAULT_CHUNK_SIZE, headers: Optional[dict] = None) -> List[dict]:
+    """Request Tika's XHTML rendering of a document and return typed blocks."""
+    logging.info(f"extract_blocks called with tika_url: {tika_url}, block_types: {block_types}")
+    with limited(tika_url, is_overload):
+        with open_stream(file_bytes, tika_url, accept="text/xml", headers=headers) as response:
+            blocks = list(parse_blocks(response.iter_content(chunk_size=chunk_size), block_types))
+    logging.info(f"Parsed {len(blocks)} blocks from XHTML")
+    return blocks
+
+def extract_paged_text(file_bytes: bytes, tika_url: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                       headers: Optional[dict] = None) -> str:
+    """Request Tika's XHTML rendering of a document and return its plain text
+    with a form feed at each page break, for formats that have pages."""
+    logging.info(f"extract_paged_text called with tika_url: {tika_url}")
+    with limited(tika_url, is_overload):
+        with open_stream(file_bytes, tika_url, accept="text/xml", headers=headers) as response:
+            return parse_paged_text(response.iter_content(chunk_size=chunk_size))
@@ -0,0 +1,76 @@
+import io
+import os
+import zipfile
+import pytest
+from pypdf import PdfWriter
+from app.batching import extract_batch, pack, plan_batches, split_results
+from app.stub_tika import start_stub
+from app.tika_client import extract_metadata
+
+def _pdf() -> bytes:
+    writer = PdfWriter()
+    writer.add_blank_page(width=200, height=200)
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+DOCUMENTS = [
+    b"Plain text document\nwith two lines\n",
+    b"<html><head><title>Page</title></head><body><p>Hello <b>HTML</b></p></body></html>",
+    b"name,value\nalpha,1\nbeta,2\n",
+    b'{"key": "value", "list": [1, 2, 3]}',
+    b'<?xml version="1.0"?><root><item>XML text</item></root>',
+    b"{\\rtf1\\ansi RTF text\\par}",
+    _pdf(),
+]
+
+@pytest.fixture(scope="module")
+def stub_url():
+    stub = start_stub(0)
+    yield f"http://127.0.0.1:{stub.server_port}"
+    stub.shutdown()
+
+def test_plan_batches_respects_limits(monkeypatch):
+    monkeypatch.setattr("app.batching.BATCH_MAX_FILES", 2)
+    monkeypatch.setattr("app.batching.BATCH_MAX_BYTES", 100)
+    assert plan_batches([(0, 10), (1, 10), (2, 10), (3, 90), (4, 20), (5, 95)]) == [[0, 1], [2, 3], [4], [5]]
+
+def test_pack_stamps_a_fixed_entry_date():
+    with zipfile.ZipFile(io.BytesIO(pack([b"a", b"b"]))) as archive:
+        assert [info.filename for info in archive.infolist()] == ["00000", "00001"]
+        assert {info.date_time for info in archive.infolist()} == {(1980, 1, 1, 0, 0, 0)}
+        assert {info.compress_type for info in archive.infolist()} == {zipfile.ZIP_STORED}
+
+def test_split_results_removes_container_metadata():
+    documents = [
+        {"Content-Type": "application/zip"},
+        {"X-TIKA:embedded_resource_path": "/00000", "X-TIKA:content": "first", "resourceName": "00000",
+         "X-TIKA:internalPath": "00000", "Content-Length": "5", "embeddedResourceType": "ATTACHMENT",
+         "dcterms:modified": "1979-12-31T23:00:00Z", "Content-Type": "text/plain"},
+        # A document's own modification date is kept.
+        {"X-TIKA:embedded_resource_path": "/00001", "X-TIKA:content": "second",
+         "dcterms:modified": "2024-05-01T10:00:00Z", "Content-Type": "application/pdf"},
+        {"X-TIKA:embedded_resource_path": "/00002", "X-TIKA:EXCEPTION:container_exception": "boom"},
+        {"X-TIKA:embedded_resource_path": "/00003", "X-TIKA:content": "outer"},
+        {"X-TIKA:embedded_resource_path": "/00003/inner.txt", "X-TIKA:content": "inner"},
+    ]
+    assert split_results(documents, 4) == [
+        ({"Content-Type": "text/plain"}, "first"),
+        ({"dcterms:modified": "2024-05-01T10:00:00Z", "Content-Type": "application/pdf"}, "second"),
+        None,
+        None,
+    ]
+
+def _assert_batch_matches_per_file(tika_url: str):
+    batched = extract_batch(DOCUMENTS, tika_url, {})
+    for document, member in zip(DOCUMENTS, batched):
+        assert member is not None
+        metadata, text = extract_metadata(document, tika_url)
+        assert member == (metadata, text)
+
+def test_batch_matches_per_file_on_stub(stub_url):
+    _assert_batch_matches_per_file(stub_url)
+
+@pytest.mark.skipif(not os.environ.get("TIKA_URL"), reason="set TIKA_URL to test against a real Tika server")
+def test_batch_matches_per_file_on_tika():
+    _assert_batch_matches_per_file(os.environ["TIKA_URL"])
@@ -0,0 +1,92 @@
+import gzip
+import json
+import pytest
+from app import bulk_export
+from app.stub_tika import start_stub
+
+class Interrupted(Exception):
+    pass
+
+@pytest.fixture(scope="module")
+def tika_url():
+    stub = start_stub(0)
+    yield f"http://127.0.0.1:{stub.server_port}"
+    stub.shutdown()
+
+@pytest.fixture
+def corpus(tmp_path):
+    root = tmp_path / "corpus"
+    root.mkdir()
+    for number in range(7):
+        (root / f"doc{number}.txt").write_text(f"document {number}", encoding="utf-8")
+    return root
+
+def _exported_paths(output) -> list:
+    paths = []
+    for shard in sorted(output.glob("part-*.jsonl.gz")):
+        with gzip.open(shard, "rt", encoding="utf-8") as f:
+            paths.extend(json.loads(line)["path"] for line in f)
+    return paths
+
+def _failed_paths(path) -> list:
+    return [json.loads(line)["path"] for line in path.read_text(encoding="utf-8").splitlines()]
+
+def _interrupt_at(monkeypatch, name: str):
+    # Stands in for the process being killed while extracting name.
+    extract_one = bulk_export.extract_one
+
+    def interrupted(path, *args):
+        if path.endswith(name):
+            raise Interrupted()
+        return extract_one(path, *args)
+
+    monkeypatch.setattr(bulk_export, "extract_one", interrupted)
+
+def test_resume_after_interrupt_exports_each_file_once(tmp_path, corpus, tika_url, monkeypatch):
+    output = tmp_path / "out"
+    extract_one = bulk_export.extract_one
+    _interrupt_at(monkeypatch, "doc4.txt")
+    with pytest.raises(Interrupted):
+        bulk_export.run(str(corpus), str(output), tika_url, concurrency=1, shard_size=2)
+    # Only complete shards are kept; how many depends on which of the files
+    # in flight were collected before the interrupt.
+    assert len(_exported_paths(output)) in (2, 4)
+
+    monkeypatch.setattr(bulk_export, "extract_one", extract_one)
+    totals = bulk_export.run(str(corpus), str(output), tika_url, concurrency=1, shard_size=2)
+    assert sorted(_exported_paths(output)) == sorted(str(path) for path in corpus.iterdir())
+    assert totals["files"] == 7
+
+def test_retrying_failures_writes_to_a_new_file(tmp_path, corpus, tika_url, monkeypatch):
+    output = tmp_path / "out"
+    bad = str(corpus / "doc3.txt")
+    extract_one = bulk_export.extract_one
+
+    def failing(path, *args):
+        return (None, "boom", 0) if path == bad else extract_one(path, *args)
+
+    monkeypatch.setattr(bulk_export, "extract_one", failing)
+    bulk_export.run(str(corpus), str(output), tika_url, concurrency=2, shard_size=3)
+    assert _failed_paths(output / "failed.jsonl") == [bad]
+
+    # Still failing: the retry run records it apart from the file it reads.
+    totals = bulk_export.run(str(output / "failed.jsonl"), str(output), tika_url, shard_size=3)
+    assert totals["failed"] == 1
+    assert _failed_paths(output / "failed.jsonl") == [bad]
+    assert _failed_paths(output / "failed.1.jsonl") == [bad]
+
+    monkeypatch.setattr(bulk_export, "extract_one", extract_one)
+    totals = bulk_export.run(str(output / "failed.1.jsonl"), str(output), tika_url, shard_size=3)
+    assert totals == {"files": 1, "bytes": len("document 3"), "failed": 0}
+    assert sorted(_exported_paths(output)) == sorted(str(path) for path in corpus.iterdir())
+    assert not (output / "failed.2.jsonl").exists()
+
+def test_unfinished_run_is_not_resumed_with_another_source(tmp_path, corpus, tika_url, monkeypatch):
+    output = tmp_path / "out"
+    _interrupt_at(monkeypatch, "doc4.txt")
+    with pytest.raises(Interrupted):
+        bulk_export.run(str(corpus), str(output), tika_url, concurrency=1, shard_size=2)
+    manifest = tmp_path / "manifest.txt"
+    manifest.write_text(str(corpus / "doc0.txt") + "\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="unfinished run"):
+        bulk_export.run(str(manifest), str(output), tika_url)
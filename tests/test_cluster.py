@@ -0,0 +1,104 @@
+import asyncio
+import json
+import socket
+import threading
+from collections import Counter
+import pytest
+import requests
+from app.cluster import Cluster, HashRing
+
+NODES = [f"http://10.0.0.{number}:8000" for number in range(1, 5)]
+KEYS = [f"{number:064x}" for number in range(4000)]
+
+def test_owner_is_stable_and_independent_of_node_order():
+    ring = HashRing(NODES)
+    shuffled = HashRing(list(reversed(NODES)))
+    assert [ring.owner(key) for key in KEYS[:200]] == [shuffled.owner(key) for key in KEYS[:200]]
+
+def test_ownership_is_spread_evenly():
+    ring = HashRing(NODES)
+    counts = Counter(ring.owner(key) for key in KEYS)
+    assert set(counts) == set(NODES)
+    assert all(abs(count / len(KEYS) - 0.25) < 0.05 for count in counts.values())
+    assert sum(ring.shares().values()) == pytest.approx(1.0)
+
+def test_leaving_node_only_moves_its_own_keys():
+    before = HashRing(NODES)
+    after = HashRing(NODES[:-1])
+    moved = [key for key in KEYS if before.owner(key) != after.owner(key)]
+    assert all(before.owner(key) == NODES[-1] for key in moved)
+    assert len(moved) == sum(before.owner(key) == NODES[-1] for key in KEYS)
+
+def test_joining_node_only_takes_keys():
+    before = HashRing(NODES[:-1])
+    after = HashRing(NODES)
+    assert all(after.owner(key) == NODES[-1] for key in KEYS if before.owner(key) != after.owner(key))
+
+def test_excluded_nodes_are_skipped():
+    ring = HashRing(NODES)
+    for key in KEYS[:100]:
+        owner = ring.owner(key)
+        assert ring.owner(key, exclude=[owner]) not in (owner, None)
+    assert ring.owner(KEYS[0], exclude=NODES) is None
+    assert HashRing([]).owner(KEYS[0]) is None
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield loop
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+async def _echo(file_bytes: bytes, tika_url: str, options: dict) -> dict:
+    return {"content": file_bytes.decode("utf-8"), "tika_url": tika_url, "options": options}
+
+def _start(loop, secret: str = "") -> Cluster:
+    url = f"http://127.0.0.1:{_free_port()}"
+    cluster = Cluster(url, url, secret=secret)
+    cluster.start(loop, _echo)
+    return cluster
+
+def test_peer_endpoint_serves_extractions(loop):
+    cluster = _start(loop)
+    try:
+        result = asyncio.run(cluster.forward(cluster.self_url, b"hello", "http://tika:9998", {"mode": "text"}))
+    finally:
+        cluster.stop()
+    assert result == {"content": "hello", "tika_url": "http://tika:9998", "options": {"mode": "text"}}
+
+@pytest.mark.parametrize("header", [None, "not json", json.dumps({"tika_url": "http://tika:9998"}),
+                                    json.dumps({"tika_url": 1, "options": {}})])
+def test_peer_endpoint_rejects_malformed_requests(loop, header):
+    cluster = _start(loop)
+    headers = {"X-Tika-MCP-Request": header} if header is not None else {}
+    try:
+        response = requests.post(f"{cluster.self_url}/extract", data=b"x", headers=headers, timeout=5)
+    finally:
+        cluster.stop()
+    assert response.status_code == 400
+
+def test_peer_endpoint_checks_the_secret(loop):
+    cluster = _start(loop, secret="s3cret")
+    request = json.dumps({"tika_url": "http://tika:9998", "options": {}})
+    try:
+        denied = requests.post(f"{cluster.self_url}/extract", data=b"x", timeout=5,
+                               headers={"X-Tika-MCP-Request": request, "X-Tika-MCP-Secret": "wrong"})
+        allowed = requests.post(f"{cluster.self_url}/extract", data=b"x", timeout=5,
+                                headers={"X-Tika-MCP-Request": request, "X-Tika-MCP-Secret": "s3cret"})
+    finally:
+        cluster.stop()
+    assert denied.status_code == 403
+    assert allowed.json()["result"]["content"] == "x"
+
+def test_public_bind_requires_a_secret(loop):
+    cluster = Cluster(f"http://192.0.2.1:{_free_port()}", "")
+    with pytest.raises(Exception, match="TIKA_CLUSTER_SECRET"):
+        cluster.start(loop, _echo)
@@ -0,0 +1,37 @@
+import random
+from app import concurrency
+from app.concurrency import AdaptiveLimiter
+
+# Typical latencies, in seconds, of a healthy Tika: detection and metadata
+# are fast, full extraction with OCR is slow.
+HEALTHY_LATENCY = {"detect": 0.005, "meta": 0.02, "tika": 3.0}
+
+def _saturate(limiter: AdaptiveLimiter):
+    while limiter.in_flight < int(limiter.limit):
+        limiter.acquire()
+
+def _run(limiter: AdaptiveLimiter, rng: random.Random, samples: int, scale: dict = None):
+    for _ in range(samples):
+        endpoint = rng.choice(list(HEALTHY_LATENCY))
+        latency = HEALTHY_LATENCY[endpoint] * (scale or {}).get(endpoint, 1.0) * rng.uniform(0.8, 1.25)
+        limiter.release(latency, "success", endpoint)
+        _saturate(limiter)
+
+def test_mixed_healthy_workload_keeps_the_limit(monkeypatch):
+    monkeypatch.setattr(concurrency, "DECREASE_COOLDOWN", 0.0)
+    limiter = AdaptiveLimiter(initial=8)
+    _saturate(limiter)
+    _run(limiter, random.Random(1), 2000)
+    assert limiter.decreases == 0
+    assert limiter.limit >= 8
+
+def test_slow_endpoint_still_shrinks_the_limit(monkeypatch):
+    monkeypatch.setattr(concurrency, "DECREASE_COOLDOWN", 0.0)
+    limiter = AdaptiveLimiter(initial=8)
+    _saturate(limiter)
+    rng = random.Random(2)
+    _run(limiter, rng, 500)
+    limit = limiter.limit
+    _run(limiter, rng, 60, scale={"tika": 10.0})
+    assert limiter.decreases > 0
+    assert limiter.limit < limit
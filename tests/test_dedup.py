@@ -0,0 +1,72 @@
+import random
+import numpy as np
+import pytest
+from app.dedup import MinHashLSH, MinHasher, estimate_similarity, shingle_hashes
+
+def _document(seed: int, words: int = 400) -> str:
+    rng = random.Random(seed)
+    return " ".join(f"word{rng.randrange(5000)}" for _ in range(words))
+
+def _edit(text: str, fraction: float, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    words = text.split()
+    for position in rng.sample(range(len(words)), int(len(words) * fraction)):
+        words[position] = f"changed{position}"
+    return " ".join(words)
+
+def test_shingles_ignore_case_and_punctuation():
+    assert np.array_equal(shingle_hashes("The quick, brown FOX jumps"), shingle_hashes("the quick brown fox jumps"))
+    assert len(shingle_hashes("")) == 0
+    # Texts shorter than one shingle still get a single hash.
+    assert len(shingle_hashes("two words")) == 1
+
+def test_signature_is_deterministic():
+    text = _document(1)
+    assert np.array_equal(MinHasher().signature(text), MinHasher().signature(text))
+
+def test_similarity_estimate_tracks_edits():
+    hasher = MinHasher()
+    original = _document(2)
+    assert estimate_similarity(hasher.signature(original), hasher.signature(original)) == 1.0
+    near = estimate_similarity(hasher.signature(original), hasher.signature(_edit(original, 0.005)))
+    far = estimate_similarity(hasher.signature(original), hasher.signature(_document(3)))
+    assert near > 0.8
+    assert far < 0.1
+
+def test_query_finds_near_duplicates_only():
+    index = MinHashLSH()
+    original = _document(4)
+    index.add("original", original)
+    index.add("near", _edit(original, 0.005))
+    index.add("other", _document(5))
+    matches = index.query(index.get_signature("original"), 0.8, exclude="original")
+    assert [key for key, _ in matches] == ["near"]
+
+def test_reindexing_replaces_the_old_signature():
+    index = MinHashLSH()
+    index.add("doc", _document(6))
+    index.add("doc", _document(7))
+    assert len(index) == 1
+    assert index.query(MinHasher().signature(_document(6)), 0.5) == []
+
+def test_signatures_are_reused_for_identical_text(monkeypatch):
+    index = MinHashLSH()
+    text = _document(8)
+    index.add("first", text)
+    monkeypatch.setattr(index.hasher, "signature", lambda *args: pytest.fail("signature recomputed"))
+    assert np.array_equal(index.add("second", text), index.get_signature("first"))
+
+def test_index_is_bounded():
+    index = MinHashLSH(max_documents=3)
+    for number in range(5):
+        index.add(f"doc{number}", _document(number))
+    assert len(index) == 3
+    assert index.evictions == 2
+    assert index.get_signature("doc0") is None and index.get_signature("doc4") is not None
+    # Evicted documents leave no bucket entries behind.
+    assert all(key in index.signatures for band in index.buckets for members in band.values() for key in members)
+    assert len(index.text_signatures) == 3
+
+def test_bands_must_divide_permutations():
+    with pytest.raises(ValueError):
+        MinHashLSH(num_perm=100, bands=16)
@@ -0,0 +1,16 @@
+import io
+from PIL import Image
+from app.image_preprocess import is_image, preprocess_image
+
+def _png(size) -> bytes:
+    output = io.BytesIO()
+    Image.new("L", size, 255).save(output, format="PNG")
+    return output.getvalue()
+
+def test_decompression_bomb_is_left_to_tika(monkeypatch):
+    data = _png((200, 200))
+    assert is_image(data)
+    # Pillow refuses to open images over twice MAX_IMAGE_PIXELS.
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 100 * 100)
+    assert preprocess_image(data) is None
+    assert not is_image(data)
@@ -0,0 +1,82 @@
+import asyncio
+import pytest
+from app import model
+from app.jobs import CRASHED_ERROR, JobQueue, JobStore
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    yield store
+    store.close()
+
+def test_job_that_keeps_crashing_the_server_fails(store):
+    job_id = store.add({"file_path": "crash.pdf"})
+    for _ in range(2):
+        assert store.claim()["id"] == job_id
+        # The server dies mid-extraction and restarts.
+        assert store.requeue_running(3, 60) == (1, 0)
+    assert store.claim()["id"] == job_id
+    assert store.requeue_running(3, 60) == (0, 1)
+    job = store.get(job_id)
+    assert (job["status"], job["attempts"], job["error"]) == ("failed", 3, CRASHED_ERROR)
+    assert store.claim() is None
+
+async def _wait_for(queue: JobQueue, job_id: str, statuses) -> str:
+    for _ in range(200):
+        job = await queue.get(job_id)
+        if job["status"] in statuses:
+            return job["status"]
+        await asyncio.sleep(0.02)
+    raise AssertionError(f"job {job_id} stayed {job['status']}")
+
+def test_worker_survives_store_errors(tmp_path, monkeypatch):
+    async def extract(**request):
+        return {"metadata": {}, "content": request["file_path"]}
+
+    monkeypatch.setattr(model, "extract_file_content", extract)
+
+    async def scenario():
+        queue = JobQueue(str(tmp_path / "jobs.db"), workers=1)
+        await queue.start()
+        finish = queue.store.finish
+        calls = []
+
+        def flaky_finish(*args):
+            calls.append(args)
+            if len(calls) == 1:
+                raise RuntimeError("database is locked")
+            finish(*args)
+
+        monkeypatch.setattr(queue.store, "finish", flaky_finish)
+        try:
+            first = await queue.submit({"file_path": "a.txt"})
+            second = await queue.submit({"file_path": "b.txt"})
+            assert await _wait_for(queue, second, ("done",)) == "done"
+            assert (await queue.get(first))["status"] == "running"
+            assert queue.stats()["workers"] == 1
+        finally:
+            await queue.stop()
+
+    asyncio.run(scenario())
+
+def test_stopping_does_not_count_the_attempt(tmp_path, monkeypatch):
+    async def extract(**request):
+        await asyncio.sleep(60)
+
+    monkeypatch.setattr(model, "extract_file_content", extract)
+
+    async def scenario():
+        queue = JobQueue(str(tmp_path / "jobs.db"), workers=1)
+        await queue.start()
+        job_id = await queue.submit({"file_path": "slow.pdf"})
+        await _wait_for(queue, job_id, ("running",))
+        await queue.stop()
+        return job_id
+
+    job_id = asyncio.run(scenario())
+    store = JobStore(str(tmp_path / "jobs.db"))
+    try:
+        job = store.get(job_id)
+        assert (job["status"], job["attempts"]) == ("queued", 0)
+    finally:
+        store.close()
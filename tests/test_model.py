@@ -0,0 +1,71 @@
+import asyncio
+import random
+import pytest
+from app import model
+from app.cache import ResultCache
+from app.stub_tika import start_stub
+
+@pytest.fixture(scope="module")
+def tika_url():
+    stub = start_stub(0)
+    yield f"http://127.0.0.1:{stub.server_port}"
+    stub.shutdown()
+
+def _words(seed: int, count: int = 300) -> str:
+    rng = random.Random(seed)
+    return " ".join(f"w{rng.randrange(10000)}" for _ in range(count))
+
+def test_near_duplicates_are_found_after_background_indexing(tmp_path, tika_url):
+    text = _words(101)
+    (tmp_path / "a.txt").write_text(text, encoding="utf-8")
+    (tmp_path / "b.txt").write_text(text + " extra", encoding="utf-8")
+    (tmp_path / "c.txt").write_text(_words(102), encoding="utf-8")
+
+    async def run():
+        await model.extract_file_content(str(tmp_path / "b.txt"), tika_url)
+        return await model.find_near_duplicates(str(tmp_path / "a.txt"), tika_url,
+                                                [str(tmp_path / "b.txt"), str(tmp_path / "c.txt")])
+
+    result = asyncio.run(run())
+    assert [match["file_path"] for match in result["duplicates"]] == [str(tmp_path / "b.txt")]
+
+def test_collapse_duplicates_signs_the_returned_text(tmp_path, tika_url):
+    text = _words(103)
+    paths = []
+    for name, content in [("x.txt", text), ("y.txt", text), ("z.txt", _words(104))]:
+        (tmp_path / name).write_text(content, encoding="utf-8")
+        paths.append(str(tmp_path / name))
+    result = asyncio.run(model.extract_files(paths, tika_url, collapse_duplicates=True, batch_small_files=False))
+    assert [item.get("duplicate_of") for item in result["results"]] == [None, paths[0], None]
+
+def test_postprocess_removes_headers_repeated_across_pages(tmp_path, tika_url):
+    words = ["alpha", "bravo", "charlie", "delta", "echo"]
+    pages = ["ACME Quarterly Report\n" + "\n".join(f"{word} paragraph {line}" for line in range(6)) +
+             f"\nPage {number} of 5" for number, word in enumerate(words, 1)]
+    path = tmp_path / "report.txt"
+    path.write_text("\f".join(pages), encoding="utf-8")
+    result = asyncio.run(model.extract_file_content(str(path), tika_url, postprocess=True))
+    assert "ACME Quarterly Report" not in result["content"]
+    assert "of 5" not in result["content"]
+    assert "charlie paragraph 3" in result["content"]
+
+def test_pages_of_unpaged_format_are_rejected(tmp_path, tika_url):
+    path = tmp_path / "notes.txt"
+    path.write_text("no pages here", encoding="utf-8")
+    result = asyncio.run(model.extract_file_content(str(path), tika_url, pages="1"))
+    assert result["error"].startswith("Page ranges are only supported")
+
+def test_batched_results_do_not_depend_on_the_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(model, "result_cache", ResultCache(max_entries=0))
+    paths = []
+    for number in range(8):
+        path = tmp_path / f"small{number}.txt"
+        path.write_text(f"small file number {number}", encoding="utf-8")
+        paths.append(str(path))
+    stub = start_stub(0)
+    try:
+        result = asyncio.run(model.extract_files(paths, f"http://127.0.0.1:{stub.server_port}"))
+    finally:
+        stub.shutdown()
+    assert [item["content"].strip() for item in result["results"]] == [f"small file number {n}" for n in range(8)]
+    assert stub.put_requests == {"/rmeta/text": 1}
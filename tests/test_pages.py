@@ -0,0 +1,45 @@
+import io
+import pytest
+from pypdf import PdfReader, PdfWriter
+from app.pages import is_pdf, parse_page_ranges, slice_pdf
+
+def _pdf(page_count: int) -> bytes:
+    # Pages of distinct widths, so slices can be told apart without text.
+    writer = PdfWriter()
+    for number in range(1, page_count + 1):
+        writer.add_blank_page(width=100 + number, height=200)
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+def _widths(pdf: bytes) -> list:
+    return [int(page.mediabox.width) - 100 for page in PdfReader(io.BytesIO(pdf)).pages]
+
+def test_parse_page_ranges():
+    assert parse_page_ranges("40-45") == [40, 41, 42, 43, 44, 45]
+    assert parse_page_ranges("7-9, 1,3,3") == [1, 3, 7, 8, 9]
+    assert parse_page_ranges("5-5") == [5]
+
+@pytest.mark.parametrize("spec", ["", ",", "0", "3-1", "a-b", "1-2-3", "-4", "1-1000000"])
+def test_parse_page_ranges_rejects_invalid_specs(spec):
+    with pytest.raises(ValueError):
+        parse_page_ranges(spec)
+
+def test_slice_pdf_keeps_requested_pages_in_order():
+    sliced, kept = slice_pdf(_pdf(6), [2, 4, 5])
+    assert kept == [2, 4, 5]
+    assert _widths(sliced) == [2, 4, 5]
+
+def test_slice_pdf_drops_pages_past_the_end():
+    sliced, kept = slice_pdf(_pdf(3), [2, 3, 4, 10])
+    assert kept == [2, 3]
+    assert _widths(sliced) == [2, 3]
+
+def test_slice_pdf_rejects_ranges_outside_the_document():
+    with pytest.raises(ValueError):
+        slice_pdf(_pdf(3), [4, 5])
+
+def test_slice_pdf_ignores_other_formats():
+    assert not is_pdf(b"plain text")
+    assert slice_pdf(b"plain text", [1]) is None
+    assert slice_pdf(b"%PDF-1.4 truncated", [1]) is None
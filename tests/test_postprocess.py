@@ -0,0 +1,27 @@
+from app.postprocess import dehyphenate, normalize_whitespace, postprocess_text, remove_boilerplate
+
+def _page(number: int) -> str:
+    return "\n".join([
+        "ACME Corp Annual Report", f"Section {number}", "Introduction text",
+        "Name:", f"Person {number}", "Body text", "More body",
+        "Closing line", f"Page {number} of 5"])
+
+def test_removes_repeated_page_edges():
+    text = remove_boilerplate("\f".join(_page(number) for number in range(1, 6)))
+    assert "ACME Corp" not in text
+    assert "of 5" not in text
+    assert text.count("Name:") == 5
+    assert text.count("\f") == 4
+
+def test_keeps_repeated_lines_in_page_bodies():
+    text = "Name:\nAlice\n\n\n\nName:\nBob\n\n\n\nName:\nCarol"
+    assert remove_boilerplate(text) == text
+
+def test_needs_enough_pages():
+    text = "\f".join(_page(number) for number in range(1, 3))
+    assert remove_boilerplate(text) == text
+
+def test_dehyphenate_and_normalize():
+    assert dehyphenate("extrac-\ntion") == "extraction"
+    assert normalize_whitespace("a  \t b \n\n\n\n c ") == "a b\n\nc"
+    assert "\f" not in postprocess_text("\f".join(_page(number) for number in range(1, 6)))
@@ -0,0 +1,59 @@
+import asyncio
+import pytest
+from app.singleflight import SingleFlight
+
+def test_concurrent_calls_share_one_execution_and_get_independent_copies():
+    flight = SingleFlight()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"content": [{"page": 1}, {"page": 2}]}
+
+    async def caller():
+        result = await flight.do("key", work)
+        # Callers that edit their result in place must not affect each other.
+        for block in result["content"]:
+            block["page"] += 10
+        await asyncio.sleep(0)
+        return [block["page"] for block in result["content"]]
+
+    async def main():
+        return await asyncio.gather(*(caller() for _ in range(3)))
+
+    assert asyncio.run(main()) == [[11, 12]] * 3
+    assert calls == 1
+    assert flight.stats() == {"in_flight": 0, "executed": 1, "coalesced": 2}
+
+def test_errors_reach_every_caller():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("Tika failed")
+
+    async def main():
+        return await asyncio.gather(*(flight.do("key", work) for _ in range(2)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+def test_cancelling_one_caller_keeps_the_shared_call():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return {"ok": True}
+
+    async def main():
+        first = asyncio.ensure_future(flight.do("key", work))
+        second = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == {"ok": True}
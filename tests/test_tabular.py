@@ -0,0 +1,70 @@
+import openpyxl
+import pytest
+from app.tabular import extract_table, read_table, table_format
+
+ROWS = [["id", "name", "score"]] + [[number, f"name{number}", number * 1.5] for number in range(1, 101)]
+
+def test_first_rows_and_projection():
+    result = read_table(iter(ROWS), columns=["score", "id"], max_rows=3, stats=False)
+    assert result["columns"] == ["score", "id"]
+    assert result["values"] == [[1.5, 3.0, 4.5], [1, 2, 3]]
+    assert result["rows_returned"] == 3
+    assert result["truncated"] is True
+    assert "stats" not in result
+
+def test_stats_cover_the_whole_table():
+    result = read_table(iter(ROWS), max_rows=5)
+    assert result["rows_read"] == 100 and result["rows_returned"] == 5
+    assert result["stats"]["id"] == {"count": 100, "nulls": 0, "types": {"number": 100},
+                                     "min": 1, "max": 100, "mean": 50.5, "distinct": 100}
+    assert result["stats"]["name"]["types"] == {"text": 100}
+
+def test_sample_is_uniform_ordered_and_reproducible():
+    result = read_table(iter(ROWS), sample=10, stats=False, seed=3)
+    numbers = result["row_numbers"]
+    assert len(numbers) == 10 and numbers == sorted(numbers)
+    assert result["values"][0] == numbers
+    assert read_table(iter(ROWS), sample=10, stats=False, seed=3) == result
+
+def test_blank_rows_and_missing_headers():
+    rows = [["a", None], [1, 2], [None, None], [3]]
+    result = read_table(iter(rows), stats=False)
+    assert result["columns"] == ["a", "column_2"]
+    assert result["values"] == [[1, 3], [2, None]]
+    assert read_table(iter(rows), header=False, stats=False)["rows_read"] == 3
+
+def test_unknown_column():
+    with pytest.raises(Exception, match="Unknown column"):
+        read_table(iter(ROWS), columns=["missing"])
+
+def test_empty_table():
+    assert read_table(iter([]))["columns"] == []
+
+def test_csv_keeps_codes_as_text(tmp_path):
+    path = tmp_path / "codes.csv"
+    path.write_text("zip,count,ratio,note\n02134,12,0.5,1_000\n10001,-3,1e3, 5\n", encoding="utf-8")
+    result = extract_table(str(path), stats=False)
+    assert result["format"] == "csv"
+    assert result["values"] == [["02134", 10001], [12, -3], [0.5, 1000.0], ["1_000", " 5"]]
+
+def test_xlsx(tmp_path):
+    path = tmp_path / "book.xlsx"
+    workbook = openpyxl.Workbook()
+    workbook.active.title = "First"
+    workbook.create_sheet("Data")
+    for row in ROWS[:4]:
+        workbook["Data"].append(row)
+    workbook.save(path)
+    assert table_format(str(path)) == "xlsx"
+    result = extract_table(str(path), sheet="Data", columns=["name"], stats=False)
+    assert result["sheet"] == "Data" and result["sheets"] == ["First", "Data"]
+    assert result["values"] == [["name1", "name2", "name3"]]
+    with pytest.raises(Exception, match="Unknown sheet"):
+        extract_table(str(path), sheet="Missing")
+
+def test_other_formats_are_rejected(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("hello", encoding="utf-8")
+    assert table_format(str(path)) is None
+    with pytest.raises(Exception, match="Not a CSV or XLSX"):
+        extract_table(str(path))
@@ -0,0 +1,26 @@
+from app.stub_tika import start_stub
+from app.tika_client import extract_metadata, iter_text, request_text
+
+class _Response:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def iter_content(self, chunk_size):
+        return iter(self.chunks)
+
+def test_iter_text_decodes_characters_split_across_chunks():
+    raw = "naïve – 日本語".encode("utf-8")
+    chunks = [raw[i:i + 1] for i in range(len(raw))]
+    assert "".join(iter_text(_Response(chunks))) == "naïve – 日本語"
+
+def test_request_text_and_metadata_against_stub():
+    stub = start_stub(0)
+    url = f"http://127.0.0.1:{stub.server_port}"
+    try:
+        text = "Größe\n" * 50000
+        assert request_text(text.encode("utf-8"), url, chunk_size=1000) == text
+        metadata, content = extract_metadata(b"hello", url)
+    finally:
+        stub.shutdown()
+    assert content == "hello"
+    assert metadata["Content-Type"].startswith("text/plain")
@@ -0,0 +1,99 @@
+import pytest
+from app.stub_tika import start_stub
+from app.xhtml_blocks import extract_blocks, parse_blocks, parse_paged_text
+
+# Shaped like Tika's XML serialization (Accept: text/xml) of a scanned PDF:
+# self-closed <meta> and <br/>, one <div class="page"> per page and OCR
+# output in <div class="ocr"> outside any paragraph.
+TIKA_XML = b"""<?xml version="1.0" encoding="UTF-8"?><html xmlns="http://www.w3.org/1999/xhtml">
+<head>
+<meta name="pdf:PDFVersion" content="1.4"/>
+<meta name="X-TIKA:Parsed-By" content="org.apache.tika.parser.DefaultParser"/>
+<meta name="Content-Type" content="application/pdf"/>
+<title>Report</title>
+</head>
+<body><div class="page"><p/>
+<h1>Annual Report</h1>
+<p>First line<br/>second line &amp; more</p>
+<table><tbody><tr>\t<td>Year</td>\t<td>Total</td></tr>
+<tr>\t<td>2024</td>\t<td> 42 </td></tr>
+</tbody></table>
+<p/>
+</div>
+<div class="page"><p/>
+<div class="ocr">Scanned <b>text</b>
+on page two</div>
+<p>Closing remarks</p>
+</div>
+</body></html>"""
+
+def _chunks(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+def test_parses_tika_xml_output():
+    blocks = list(parse_blocks([TIKA_XML]))
+    text_blocks = [block for block in blocks if block["type"] != "page"]
+    assert [(block["type"], block["text"]) for block in text_blocks] == [
+        ("heading", "Annual Report"),
+        ("paragraph", "First line second line & more"),
+        ("table", "Year\tTotal\n2024\t42"),
+        ("paragraph", "Scanned text on page two"),
+        ("paragraph", "Closing remarks"),
+    ]
+    assert text_blocks[0]["level"] == 1
+    assert text_blocks[2]["rows"] == [["Year", "Total"], ["2024", "42"]]
+    assert [block["page"] for block in text_blocks] == [1, 1, 1, 2, 2]
+
+def test_offsets_follow_flattened_text():
+    blocks = [block for block in parse_blocks([TIKA_XML]) if block["type"] != "page"]
+    flattened = "\n".join(block["text"] for block in blocks)
+    for block in blocks:
+        assert flattened[block["start"]:block["end"]] == block["text"]
+
+def test_page_blocks_cover_their_content():
+    blocks = list(parse_blocks([TIKA_XML]))
+    pages = [block for block in blocks if block["type"] == "page"]
+    assert [page["page"] for page in pages] == [1, 2]
+    for block in blocks:
+        if block["type"] != "page":
+            page = pages[block["page"] - 1]
+            assert page["start"] <= block["start"] and block["end"] <= page["end"]
+
+def test_incremental_feed_matches_single_feed():
+    assert list(parse_blocks(_chunks(TIKA_XML, 7))) == list(parse_blocks([TIKA_XML]))
+
+def test_block_type_filter():
+    blocks = list(parse_blocks([TIKA_XML], ["heading", "table"]))
+    assert [block["type"] for block in blocks] == ["heading", "table"]
+    with pytest.raises(ValueError):
+        list(parse_blocks([TIKA_XML], ["footnote"]))
+
+def test_html_serialization_is_rejected():
+    # Tika's text/html output leaves <meta> unclosed; this is why extract_blocks
+    # asks for text/xml.
+    html = b'<html><head><meta name="a" content="b"><title></title></head><body><p>x</p></body></html>'
+    with pytest.raises(Exception):
+        list(parse_blocks([html]))
+
+def test_extract_blocks_against_stub():
+    stub = start_stub(0)
+    try:
+        blocks = extract_blocks(b"alpha\nbeta\fgamma", f"http://127.0.0.1:{stub.server_port}")
+    finally:
+        stub.shutdown()
+    assert [(block["type"], block.get("text")) for block in blocks] == [
+        ("paragraph", "alpha"), ("paragraph", "beta"), ("page", None), ("paragraph", "gamma"), ("page", None)]
+
+def test_paged_text_separates_pages_with_form_feeds():
+    assert parse_paged_text([TIKA_XML]).strip("\n").split("\f")[1].split() == [
+        "Scanned", "text", "on", "page", "two", "Closing", "remarks"]
+    assert parse_paged_text(_chunks(TIKA_XML, 5)).count("\f") == 1
+
+def test_slides_count_as_pages():
+    # Tika renders each presentation slide as <div class="slide-content">.
+    xml = (b'<html xmlns="http://www.w3.org/1999/xhtml"><head><title/></head><body>'
+           b'<div class="slide-content"><p>Agenda</p>\n</div><div class="slide-notes"><p>Say hi</p>\n</div>'
+           b'<div class="slide-content"><p>Results</p>\n</div></body></html>')
+    assert [(block["type"], block["page"]) for block in parse_blocks([xml])] == [
+        ("paragraph", 1), ("page", 1), ("paragraph", 1), ("paragraph", 2), ("page", 2)]
+    assert parse_paged_text([xml]).split("\f") == ["Agenda\nSay hi\n", "Results\n"]